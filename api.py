@@ -0,0 +1,272 @@
+import gzip
+import json
+from datetime import datetime
+from functools import partial
+
+from flask import Blueprint, Response, abort, request
+
+import counters
+import queries
+import replicas
+from models import Artist, Venue
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+#----------------------------------------------------------------------------#
+# JSON API.
+#----------------------------------------------------------------------------#
+
+# /api/v1 serves the data of the HTML pages to machine clients. It calls the
+# same helpers of queries.py, selects only the columns asked for with
+# ?fields=id,name, and serializes the rows straight to JSON (with orjson
+# when it is installed). Lists are paged with opaque cursors: pass the
+# next_cursor of a response as ?cursor= to get the next page. Responses are
+# gzipped for clients accepting it, and read from the replicas when there
+# are some (replicas.py).
+
+api = Blueprint('api', __name__, url_prefix='/api/v1')
+
+# Every endpoint only reads
+api.before_request(replicas.use_replica)
+
+DEFAULT_LIMIT = 50
+MAX_LIMIT = 200
+
+# Bodies smaller than this are sent uncompressed
+GZIP_MIN_SIZE = 1024
+
+# Columns a client may select, by field name. 'genres' is read from the
+# association table.
+VENUE_FIELDS = {
+    name: getattr(Venue, name) for name in (
+        'name', 'city', 'state', 'address', 'phone', 'website', 'facebook_link',
+        'seeking_talent', 'seeking_description', 'image_link',
+        'upcoming_shows_count', 'past_shows_count', 'updated_at')
+}
+
+ARTIST_FIELDS = {
+    name: getattr(Artist, name) for name in (
+        'name', 'city', 'state', 'phone', 'website', 'facebook_link',
+        'seeking_venue', 'seeking_description', 'image_link',
+        'upcoming_shows_count', 'past_shows_count', 'updated_at')
+}
+
+# Fields of a list item when ?fields= is not given; a single venue or artist
+# comes with all of them
+LIST_FIELDS = ('id', 'name', 'city', 'state', 'upcoming_shows_count')
+
+VENUE_SHOW_FIELDS = ('id', 'start_time', 'artist_id', 'artist_name', 'artist_image_link')
+ARTIST_SHOW_FIELDS = ('id', 'start_time', 'venue_id', 'venue_name', 'venue_image_link')
+SHOW_FIELDS = ('id', 'start_time', 'venue_id', 'venue_name', 'artist_id', 'artist_name', 'artist_image_link')
+SEARCH_FIELDS = ('id', 'name', 'num_upcoming_shows')
+
+
+def _default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f'{type(value).__name__} is not JSON serializable')
+
+
+def dumps(payload):
+    if orjson is not None:
+        return orjson.dumps(payload)
+    return json.dumps(payload, default=_default, separators=(',', ':')).encode()
+
+
+def _json(payload, status=200):
+    return Response(dumps(payload), status=status, mimetype='application/json')
+
+
+def _fields(available, default):
+    # The fields named by ?fields=, once each in the order given
+    requested = request.args.get('fields')
+    if not requested:
+        return list(default)
+
+    names = list(dict.fromkeys(name.strip() for name in requested.split(',') if name.strip()))
+    unknown = [name for name in names if name not in available]
+    if unknown:
+        abort(400, f'unknown fields: {", ".join(unknown)}')
+    return names
+
+
+def _limit():
+    limit = request.args.get('limit', DEFAULT_LIMIT, type=int)
+    return max(1, min(limit, MAX_LIMIT))
+
+
+def _project(rows, fields):
+    return [{name: getattr(row, name) for name in fields} for row in rows]
+
+
+#----------------------------------------------------------------------------#
+# Venues and artists.
+#----------------------------------------------------------------------------#
+
+def _entity_fields(model, model_fields, default):
+    fields = _fields(set(model_fields) | {'id', 'genres'}, default)
+    # The show counts as of now, like the show lists
+    model_fields = {**model_fields, **counters.current_counts(model)}
+    columns = [model_fields[name].label(name) for name in fields if name in model_fields]
+    return fields, columns
+
+
+def _with_genres(model, items, fields):
+    if 'genres' in fields and items:
+        genres = queries.genre_names(model, [item['id'] for item in items])
+        for item in items:
+            item['genres'] = genres[item['id']]
+    return items
+
+
+def _entity_list(model, model_fields):
+    fields, columns = _entity_fields(model, model_fields, LIST_FIELDS)
+
+    after = request.args.get('cursor')
+    if after is not None:
+        try:
+            after = int(after)
+        except ValueError:
+            abort(400, 'invalid cursor')
+
+    page = queries.entity_page(model, columns, after=after, limit=_limit())
+    items = _project(page['rows'], [name for name in fields if name != 'genres'])
+    return _json({
+        'data': _with_genres(model, items, fields),
+        'next_cursor': page['next_cursor']
+    })
+
+
+def _entity(model, model_fields, entity_id):
+    fields, columns = _entity_fields(model, model_fields, ('id', *model_fields, 'genres'))
+
+    row = queries.entity_row(model, columns, entity_id)
+    if row is None:
+        abort(404, f'no {model.__tablename__.lower()} {entity_id}')
+
+    items = _project([row], [name for name in fields if name != 'genres'])
+    return _json({'data': _with_genres(model, items, fields)[0]})
+
+
+def _sections(find_shows, owner_id, fields):
+    kind = request.args.get('kind', 'upcoming')
+    if kind not in ('past', 'upcoming'):
+        abort(400, 'kind must be past or upcoming')
+    fields = _fields(fields, fields)
+
+    try:
+        page = find_shows(owner_id, upcoming=kind == 'upcoming',
+                          after=request.args.get('cursor'), limit=_limit())
+    except ValueError:
+        abort(400, 'invalid cursor')
+
+    return _json({
+        'data': _project(page['shows'], fields),
+        'next_cursor': page['next_cursor']
+    })
+
+
+@api.route('/venues')
+def venues():
+    return _entity_list(Venue, VENUE_FIELDS)
+
+
+@api.route('/venues/<int:venue_id>')
+def venue(venue_id):
+    return _entity(Venue, VENUE_FIELDS, venue_id)
+
+
+@api.route('/venues/<int:venue_id>/shows')
+def venue_shows(venue_id):
+    # ?kind=upcoming (the default) or past
+    return _sections(queries.venue_shows, venue_id, VENUE_SHOW_FIELDS)
+
+
+@api.route('/artists')
+def artists():
+    return _entity_list(Artist, ARTIST_FIELDS)
+
+
+@api.route('/artists/<int:artist_id>')
+def artist(artist_id):
+    return _entity(Artist, ARTIST_FIELDS, artist_id)
+
+
+@api.route('/artists/<int:artist_id>/shows')
+def artist_shows(artist_id):
+    return _sections(queries.artist_shows, artist_id, ARTIST_SHOW_FIELDS)
+
+
+#----------------------------------------------------------------------------#
+# Shows and search.
+#----------------------------------------------------------------------------#
+
+@api.route('/shows')
+def shows():
+    # All shows by start time; ?cursor= walks forward, ?before= backwards
+    fields = _fields(SHOW_FIELDS, SHOW_FIELDS)
+    try:
+        page = queries.shows_page(after=request.args.get('cursor'), before=request.args.get('before'),
+                                  limit=_limit(), fields=fields)
+    except ValueError:
+        abort(400, 'invalid cursor')
+
+    return _json({
+        'data': _project(page['shows'], fields),
+        'next_cursor': page['next_cursor'],
+        'prev_cursor': page['prev_cursor']
+    })
+
+
+@api.route('/search')
+def search():
+    # ?q=term, optionally ?type=venues or ?type=artists
+    search_term = request.args.get('q', '').strip()
+    # Each type is searched once, however often it is named
+    kinds = list(dict.fromkeys(request.args.get('type', 'venues,artists').split(',')))
+    searches = {'venues': queries.venue_search, 'artists': queries.artist_search}
+    if not set(kinds) <= set(searches):
+        abort(400, 'type must be venues or artists')
+    fields = _fields(SEARCH_FIELDS, SEARCH_FIELDS)
+
+    limit = _limit()
+    results = queries.concurrently(*(partial(searches[kind], search_term, limit=limit, fields=fields)
+                                     for kind in kinds))
+
+    payload = {}
+    for kind, result in zip(kinds, results):
+        payload[kind] = {
+            'count': result['count'],
+            'data': _project(result['data'], fields)
+        }
+    return _json(payload)
+
+
+#----------------------------------------------------------------------------#
+# Errors and compression.
+#----------------------------------------------------------------------------#
+
+@api.errorhandler(400)
+@api.errorhandler(404)
+def api_error(error):
+    return _json({'error': error.description}, status=error.code)
+
+
+@api.after_request
+def compress(response):
+    response.vary.add('Accept-Encoding')
+    if (response.direct_passthrough or response.status_code < 200 or response.status_code >= 300
+            or 'Content-Encoding' in response.headers
+            or 'gzip' not in request.accept_encodings):
+        return response
+
+    body = response.get_data()
+    if len(body) < GZIP_MIN_SIZE:
+        return response
+
+    response.set_data(gzip.compress(body, compresslevel=6))
+    response.headers['Content-Encoding'] = 'gzip'
+    return response
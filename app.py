@@ -4,9 +4,8 @@
 
 import os
 import json
-import dateutil.parser
-import babel
-from flask import Flask, render_template, request, Response, flash, redirect, url_for
+from functools import wraps
+from flask import Flask, render_template, request, Response, flash, redirect, url_for, stream_with_context, abort, jsonify
 from flask_moment import Moment
 from flask_sqlalchemy import SQLAlchemy
 import logging
@@ -16,6 +15,24 @@ from flask_wtf.csrf import CSRFProtect
 from forms import *
 from flask_migrate import Migrate
 from models import Genre, Show, Venue, Artist, db 
+import export
+from api import api
+import instrumentation
+import pagecache
+import pool
+import reference
+import replicas
+import scheduling
+from conditional import conditional
+from formatting import format_datetime, format_datetimes
+from archive import archive_cli
+from counters import counters_cli
+from importer import import_csv_command
+from partitions import partitions_cli
+from queries import venue_areas, venue_search, artist_search, shows_page, venue_detail, venue_shows, artist_detail, artist_shows
+from queries import venue_sections, artist_sections
+from queries import venues_version, artists_version, venue_version, artist_version, shows_version
+from queries import concurrently
 
 #----------------------------------------------------------------------------#
 # App Config.
@@ -28,6 +45,17 @@ app.config.from_object('config')
 
 db.init_app(app)
 migrate = Migrate(app, db)
+app.cli.add_command(archive_cli)
+app.cli.add_command(counters_cli)
+app.cli.add_command(import_csv_command)
+app.cli.add_command(partitions_cli)
+app.register_blueprint(api)
+instrumentation.init_app(app)
+pagecache.init_app(app)
+
+# Number of shows listed per page at /shows
+SHOWS_PER_PAGE = 50
+MAX_SHOWS_PER_PAGE = 200
 # TODO: connect to a local postgresql database
 
 
@@ -35,16 +63,56 @@ migrate = Migrate(app, db)
 # Filters.
 #----------------------------------------------------------------------------#
 
-def format_datetime(value, format='medium'):
-  date = dateutil.parser.parse(value)
-  if format == 'full':
-      format="EEEE MMMM, d, y 'at' h:mma"
-  elif format == 'medium':
-      format="EE MM, dd, y h:mma"
-  return babel.dates.format_datetime(date, format, locale='en')
-
+# Views format their datetimes in bulk, the filter is kept for templates
 app.jinja_env.filters['datetime'] = format_datetime
 
+#----------------------------------------------------------------------------#
+# Helpers.
+#----------------------------------------------------------------------------#
+
+def stream_template(template_name, **context):
+  # Render the template chunk by chunk instead of building the whole page in memory
+  app.update_template_context(context)
+  template = app.jinja_env.get_template(template_name)
+  stream = template.stream(context)
+  stream.enable_buffering(5)
+  return stream
+
+def format_venue_shows(shows):
+  # The shows on a venue page, linking to their artist
+  pagecache.tag(*(f'listed-artist:{show.artist_id}' for show in shows))
+  start_times = format_datetimes([show.start_time for show in shows], 'full')
+  return [{
+      "artist_id": show.artist_id,
+      "artist_name": show.artist_name,
+      "artist_image_link": show.artist_image_link,
+      "start_time": start_time
+  } for show, start_time in zip(shows, start_times)]
+
+def format_artist_shows(shows):
+  # The shows on an artist page, linking to their venue
+  pagecache.tag(*(f'listed-venue:{show.venue_id}' for show in shows))
+  start_times = format_datetimes([show.start_time for show in shows], 'full')
+  return [{
+      "venue_id": show.venue_id,
+      "venue_name": show.venue_name,
+      "venue_image_link": show.venue_image_link,
+      "start_time": start_time
+  } for show, start_time in zip(shows, start_times)]
+
+def shows_page_args():
+  # The boundaries and size of a page of /shows, from the query string
+  limit = min(request.args.get('limit', SHOWS_PER_PAGE, type=int), MAX_SHOWS_PER_PAGE)
+  return request.args.get('after'), request.args.get('before'), max(limit, 1)
+
+def shows_page_version():
+  # Validator of a page of /shows, the view answers 400 for a bad cursor
+  after, before, limit = shows_page_args()
+  try:
+      return shows_version(after=after, before=before, limit=limit)
+  except ValueError:
+      return None
+
 #----------------------------------------------------------------------------#
 # Controllers.
 #----------------------------------------------------------------------------#
@@ -58,57 +126,20 @@ def index():
 #  ----------------------------------------------------------------
 
 @app.route('/venues')
+@replicas.read_only
+@pagecache.cached('venues')
+@conditional(venues_version)
 def venues():
-  # TODO: replace with real venues data.
-  #       num_upcoming_shows should be aggregated based on number of upcoming shows per venue.
-
-# Query the Venue table and join with the Show table to count the number of upcoming shows
-  venues = Venue.query.with_entities(
-        Venue.city,
-        Venue.state,
-        Venue.id,
-        Venue.name,
-        db.func.count(Show.id).label('num_upcoming_shows')
-    )\
-  .outerjoin(Show, Venue.id == Show.venue_id)\
-  .group_by(Venue.id, Venue.name, Venue.city, Venue.state)\
-  .all()
-    
-# Create a dictionary to store the formatted data
-  response_data = []
-
-# Iterate over the venues and format the data
-  for venue in venues:
-        venue_data = {
-            'city': venue.city,
-            'state': venue.state,
-            'venues': []
-        }
-
-    # Check if the city and state combination already exists in the formatted data
-        existing_data = next((data for data in response_data if data['city'] == venue.city and data['state'] == venue.state), None)
-
-        if existing_data:
-            existing_data['venues'].append({
-                'id': venue.id,
-                'name': venue.name,
-                'num_upcoming_shows': venue.num_upcoming_shows
-            })
-        else:
-            venue_data['venues'].append({
-                'id': venue.id,
-                'name': venue.name,
-                'num_upcoming_shows': venue.num_upcoming_shows
-            })
-            response_data.append(venue_data)
-
-
-  return render_template('pages/venues.html', areas=response_data);
+  # Venues are grouped by city and state, each with its number of upcoming shows.
+  # The areas are generated lazily and the page is streamed while they are rendered.
+  return Response(stream_with_context(
+      stream_template('pages/venues.html', areas=venue_areas())))
 
 
 
 
 @app.route('/venues/search', methods=['POST'])
+@replicas.read_only
 def search_venues():
   # TODO: implement search on artists with partial string search. Ensure it is case-insensitive.
   # seach for Hop should return "The Musical Hop".
@@ -117,35 +148,9 @@ def search_venues():
 # Get the search term from the form data
   search_term = request.form.get('search_term', '').strip()
 
-# Get the current datetime
-  now = datetime.now()
-
-# Perform a case-insensitive partial string search on the Venue name column
-  venues = Venue.query.filter(Venue.name.ilike(f'%{search_term}%')).all()
-
-# Initialize an empty list to store the venue data
-  response_data = []
-
-# Iterate over the venues and retrieve the number of upcoming shows for each venue
-  for venue in venues:
-      # Count the number of upcoming shows for the venue
-      num_upcoming_shows = len([show for show in venue.shows if show.start_time > now])
-      
-      # Create a dictionary with the venue data and the number of upcoming shows
-      venue_data = {
-          "id": venue.id,
-          "name": venue.name,
-          "num_upcoming_shows": num_upcoming_shows
-      }
-
-      # Add the venue data to the response_data
-      response_data.append(venue_data)
-
-# Create a response dictionary with the count of venues and the response_data
-  response = {
-      "count": len(venues),
-      "data": response_data
-  }
+# Perform a case-insensitive partial string search on the Venue name column.
+# The number of upcoming shows and the total count come back in the same query.
+  response = venue_search(search_term)
 
 # Render the search_venues.html template with the response and search_term variables
   return render_template('pages/search_venues.html', results=response, search_term=request.form.get('search_term', ''))
@@ -154,29 +159,23 @@ def search_venues():
 
 
 @app.route('/venues/<int:venue_id>')
+@replicas.read_only
+@pagecache.cached('venue:{venue_id}')
+@conditional(venue_version)
 def show_venue(venue_id):
   # shows the venue page with the given venue_id
   # TODO: replace with real venue data from the venues table, using venue_id
 
-# Get the venue by ID from the database. If not found return 404
-  venue = Venue.query.get_or_404(venue_id)
-    
-# Separate past and upcoming shows
-  now = datetime.now()
-  upcoming_shows = []
-  past_shows = []
-  
-  for show in venue.shows:
-      show_info = {
-          "artist_id": show.artist_id,
-          "artist_name": show.artist.name,
-          "artist_image_link": show.artist.image_link,
-          "start_time": format_datetime(str(show.start_time))
-      }
-      if show.start_time > now:
-          upcoming_shows.append(show_info)
-      else:
-          past_shows.append(show_info)
+# Get the venue, its genres and its show counts by ID from the database. If not found return 404
+# The header and the first page of past and upcoming shows are independent queries, run concurrently
+# when CONCURRENT_QUERIES is set. Both sections are read in one query, already run for the page's
+# version by conditional when it applies; the rest is fetched by the venue_shows_fragment
+  result, (upcoming_page, past_page) = concurrently(
+      lambda: venue_detail(venue_id),
+      lambda: venue_sections(venue_id))
+  if result is None:
+      abort(404)
+  venue, upcoming_shows_count, past_shows_count = result
 
   response_data = {
       "id": venue_id,
@@ -192,13 +191,35 @@ def show_venue(venue_id):
       "seeking_talent": venue.seeking_talent,
       "seeking_description": venue.seeking_description,
       "image_link": venue.image_link,
-      "past_shows": past_shows,
-      "past_shows_count": len(past_shows),
-      "upcoming_shows": upcoming_shows,
-      "upcoming_shows_count": len(upcoming_shows)
+      "past_shows": format_venue_shows(past_page['shows']),
+      "past_shows_count": past_shows_count,
+      "past_shows_cursor": past_page['next_cursor'],
+      "upcoming_shows": format_venue_shows(upcoming_page['shows']),
+      "upcoming_shows_count": upcoming_shows_count,
+      "upcoming_shows_cursor": upcoming_page['next_cursor']
   }
 
   return render_template('pages/show_venue.html', venue=response_data)
+
+
+@app.route('/venues/<int:venue_id>/shows')
+@replicas.read_only
+@pagecache.cached('venue:{venue_id}')
+def venue_shows_fragment(venue_id):
+  # renders the next page of a show section of the venue page
+
+  kind = request.args.get('kind', 'past')
+  if kind not in ('past', 'upcoming'):
+      abort(400)
+
+  try:
+      page = venue_shows(venue_id, upcoming=kind == 'upcoming', after=request.args.get('cursor'))
+  except ValueError:
+      abort(400)
+
+  return render_template('pages/venue_show_tiles.html', venue_id=venue_id, kind=kind,
+                         shows=format_venue_shows(page['shows']),
+                         next_cursor=page['next_cursor'])
   
     
 
@@ -226,15 +247,9 @@ def create_venue_submission():
 
   if form.validate():
       try:
-          # Create a new Venue object with the form data
-          # Retrieve the maximum ID value from the database table
-          max_id = db.session.query(db.func.max(Venue.id)).scalar()
-
-          # Increment the maximum ID value by 1 to generate the ID for the new venue
-          new_id = max_id + 1 if max_id is not None else 1
-            
+          # Create a new Venue object with the form data.
+          # The ID is assigned by the database sequence on insert.
           venue = Venue(
-              id=new_id,
               name=form.name.data,
               city=form.city.data,
               state=form.state.data,
@@ -249,9 +264,8 @@ def create_venue_submission():
         
 
           # Add the genres for the venue
-          genre_names = form.genres.data
-          genres = Genre.query.filter(Genre.name.in_(genre_names)).all()
-          venue.genres = genres
+          # The Genre rows come from the registry, the ids are written without a lookup
+          venue.genres = reference.genres.objects(form.genres.data)
 
           # Add the venue to the database
           db.session.add(venue)
@@ -290,7 +304,7 @@ def delete_venue(venue_id):
           return redirect(url_for('index'))
         
       # Delete the venue from the database
-      db.session.delete(venue_id)
+      db.session.delete(venue)
       db.session.commit()
 
       flash('Venue ' + venue.name + ' was successfully deleted.')
@@ -312,6 +326,9 @@ def delete_venue(venue_id):
 #  Artists
 #  ----------------------------------------------------------------
 @app.route('/artists')
+@replicas.read_only
+@pagecache.cached('artists')
+@conditional(artists_version)
 def artists():
   # TODO: replace with real data returned from querying the database
 
@@ -325,6 +342,7 @@ def artists():
 
 
 @app.route('/artists/search', methods=['POST'])
+@replicas.read_only
 def search_artists():
   # TODO: implement search on artists with partial string search. Ensure it is case-insensitive.
   # seach for "A" should return "Guns N Petals", "Matt Quevado", and "The Wild Sax Band".
@@ -333,35 +351,9 @@ def search_artists():
 # Get the search term from the form data
   search_term = request.form.get('search_term', '').strip()
 
-# Get the current datetime
-  now = datetime.now()
-
-# Perform a case-insensitive partial string search on the Artist name column
-  artists = Artist.query.filter(Artist.name.ilike(f'%{search_term}%')).all()
-
-# Initialize an empty list to store the artist data
-  response_data = []
-
-# Iterate over the artist and retrieve the number of upcoming shows for each artist
-  for artist in artists:
-      # Count the number of upcoming shows for the artist
-      num_upcoming_shows = len([show for show in artist.shows if show.start_time > now])
-      
-      # Create a dictionary with the artist data and the number of upcoming shows
-      artist_data = {
-          "id": artist.id,
-          "name": artist.name,
-          "num_upcoming_shows": num_upcoming_shows
-      }
-
-      # Add the artist data to the response_data
-      response_data.append(artist_data)
-
-# Create a response dictionary with the count of artists and the response_data
-  response = {
-      "count": len(artists),
-      "data": response_data
-  }
+# Perform a case-insensitive partial string search on the Artist name column.
+# The number of upcoming shows and the total count come back in the same query.
+  response = artist_search(search_term)
 
   return render_template('pages/search_artists.html', results=response, search_term=request.form.get('search_term', ''))
 
@@ -369,30 +361,24 @@ def search_artists():
 
 
 @app.route('/artists/<int:artist_id>')
+@replicas.read_only
+@pagecache.cached('artist:{artist_id}')
+@conditional(artist_version)
 def show_artist(artist_id):
   # shows the artist page with the given artist_id
   # TODO: replace with real artist data from the artist table, using artist_id
 
-# Get the artist by ID from the database. If not found reeturn 404
-  artist = Artist.query.get_or_404(artist_id)
-    
-# Separate past and upcoming shows
-  now = datetime.now()
-  upcoming_shows = []
-  past_shows = []
-  
-  for show in artist.shows:
-      show_info = {
-          "venue_id": show.venue_id,
-          "venue_name": show.venue.name,
-          "venue_image_link": show.venue.image_link,
-          "start_time": format_datetime(str(show.start_time))
-      }
-      if show.start_time > now:
-          upcoming_shows.append(show_info)
-      else:
-          past_shows.append(show_info)
-       
+# Get the artist, its genres and its show counts by ID from the database. If not found return 404
+# The header and the first page of past and upcoming shows are independent queries, run concurrently
+# when CONCURRENT_QUERIES is set. Both sections are read in one query, already run for the page's
+# version by conditional when it applies; the rest is fetched by the artist_shows_fragment
+  result, (upcoming_page, past_page) = concurrently(
+      lambda: artist_detail(artist_id),
+      lambda: artist_sections(artist_id))
+  if result is None:
+      abort(404)
+  artist, upcoming_shows_count, past_shows_count = result
+
   response_data = {
       "id": artist_id,
       "name": artist.name,
@@ -405,15 +391,37 @@ def show_artist(artist_id):
       "seeking_venue": artist.seeking_venue,
       "seeking_description": artist.seeking_description,
       "image_link": artist.image_link,
-      "past_shows": past_shows,
-      "past_shows_count": len(past_shows),
-      "upcoming_shows": upcoming_shows,
-      "upcoming_shows_count": len(upcoming_shows)
+      "past_shows": format_artist_shows(past_page['shows']),
+      "past_shows_count": past_shows_count,
+      "past_shows_cursor": past_page['next_cursor'],
+      "upcoming_shows": format_artist_shows(upcoming_page['shows']),
+      "upcoming_shows_count": upcoming_shows_count,
+      "upcoming_shows_cursor": upcoming_page['next_cursor']
   }
 
   return render_template('pages/show_artist.html', artist=response_data)
 
 
+@app.route('/artists/<int:artist_id>/shows')
+@replicas.read_only
+@pagecache.cached('artist:{artist_id}')
+def artist_shows_fragment(artist_id):
+  # renders the next page of a show section of the artist page
+
+  kind = request.args.get('kind', 'past')
+  if kind not in ('past', 'upcoming'):
+      abort(400)
+
+  try:
+      page = artist_shows(artist_id, upcoming=kind == 'upcoming', after=request.args.get('cursor'))
+  except ValueError:
+      abort(400)
+
+  return render_template('pages/artist_show_tiles.html', artist_id=artist_id, kind=kind,
+                         shows=format_artist_shows(page['shows']),
+                         next_cursor=page['next_cursor'])
+
+
 
 
 #  Update
@@ -423,7 +431,7 @@ def edit_artist(artist_id):
   # TODO: populate form with fields from artist with ID <artist_id>
   
   # Get the artist record with the specified artist_id from the database. If not found return 404
-  artist = Artist.query.get_or_404(artist_id)
+  artist = Artist.query.options(db.joinedload(Artist.genres)).get_or_404(artist_id)
 
   # Extract the genres as a list of genre names
   genres = [genre.name for genre in artist.genres]
@@ -457,8 +465,8 @@ def edit_artist_submission(artist_id):
   # TODO: take values from the form submitted, and update existing
   # artist record with ID <artist_id> using the new attributes
     
-  # Find the artist with the given ID
-  artist = Artist.query.get(artist_id)
+  # Find the artist with the given ID, with the genres replaced below
+  artist = Artist.query.options(db.joinedload(Artist.genres)).get(artist_id)
 
   if artist:
 
@@ -483,9 +491,8 @@ def edit_artist_submission(artist_id):
               artist.facebook_link = form.facebook_link.data
             
               # Update the genres for the artist
-              genre_names = form.genres.data
-              genres = Genre.query.filter(Genre.name.in_(genre_names)).all()
-              artist.genres = genres
+              # The Genre rows come from the registry, the ids are written without a lookup
+              artist.genres = reference.genres.objects(form.genres.data)
               
                 
               # Commit the changes to the database
@@ -521,7 +528,7 @@ def edit_venue(venue_id):
   # TODO: populate form with values from venue with ID <venue_id>
 
   # Get the venue record with the specified venue_id from the database. If not found return 404
-  venue = Venue.query.get_or_404(venue_id)
+  venue = Venue.query.options(db.joinedload(Venue.genres)).get_or_404(venue_id)
 
   # Extract the genres as a list of genre names
   genres = [genre.name for genre in venue.genres]
@@ -554,8 +561,8 @@ def edit_venue(venue_id):
 def edit_venue_submission(venue_id):
   # TODO: take values from the form submitted, and update existing
   # venue record with ID <venue_id> using the new attributes
-  # Find the venue with the given ID
-  venue = Venue.query.get(venue_id)
+  # Find the venue with the given ID, with the genres replaced below
+  venue = Venue.query.options(db.joinedload(Venue.genres)).get(venue_id)
 
   if venue:
       # Create an instance of the form and populate it with the submitted data
@@ -579,9 +586,8 @@ def edit_venue_submission(venue_id):
               venue.facebook_link = form.facebook_link.data
             
               # Update the genres for the venue
-              genre_names = form.genres.data
-              genres = Genre.query.filter(Genre.name.in_(genre_names)).all()
-              venue.genres = genres
+              # The Genre rows come from the registry, the ids are written without a lookup
+              venue.genres = reference.genres.objects(form.genres.data)
               
                 
               # Commit the changes to the database
@@ -634,18 +640,9 @@ def create_artist_submission():
 
   if form.validate():
       try:
-          # Create a new Artist object with the form data
-          # Retrieve the maximum ID value from the database table
-          max_id = db.session.query(db.func.max(Artist.id)).scalar()
-
-          # Increment the maximum ID value by 1 to generate the ID for the new venue
-          new_id = max_id + 1 if max_id is not None else 1
-        
-          
-        
-          # Create a new Artist object with the form data
+          # Create a new Artist object with the form data.
+          # The ID is assigned by the database sequence on insert.
           artist = Artist(
-              id=new_id,
               name=form.name.data,
               city=form.city.data,
               state=form.state.data,
@@ -658,9 +655,8 @@ def create_artist_submission():
           )
 
           # Add the genres for the artist
-          genre_names = form.genres.data
-          genres = Genre.query.filter(Genre.name.in_(genre_names)).all()
-          artist.genres = genres
+          # The Genre rows come from the registry, the ids are written without a lookup
+          artist.genres = reference.genres.objects(form.genres.data)
 
           # Add the artist to the database
           db.session.add(artist)
@@ -689,28 +685,46 @@ def create_artist_submission():
 #  ----------------------------------------------------------------
 
 @app.route('/shows')
+@replicas.read_only
+@pagecache.cached('shows')
+@conditional(shows_page_version)
 def shows():
   # displays list of shows at /shows
-  # TODO: replace with real venues data.
 
-  # Retrieve all Show records from the database
-  shows = Show.query.all()
+  # Get the page boundaries from the query string
+  after, before, limit = shows_page_args()
+
+  # Retrieve one page of shows together with their artist and venue in a single query
+  try:
+      page = shows_page(after=after, before=before, limit=limit)
+  except ValueError:
+      abort(400)
 
   # Create an empty list to store the formatted show data
   response_data = []
 
-  for show in shows:
+  # The page is purged from the cache when one of its venues or artists changes
+  pagecache.tag(*(f'listed-venue:{show.venue_id}' for show in page['shows']))
+  pagecache.tag(*(f'listed-artist:{show.artist_id}' for show in page['shows']))
+
+  # Format the start times of the whole page at once
+  start_times = format_datetimes([show.start_time for show in page['shows']], 'full')
+
+  for show, start_time in zip(page['shows'], start_times):
         show_data = {
             "venue_id"         : show.venue_id,
-            "venue_name"       : show.venue.name,
+            "venue_name"       : show.venue_name,
             "artist_id"        : show.artist_id,
-            "artist_name"      : show.artist.name,
-            "artist_image_link": show.artist.image_link,
-            "start_time"       : format_datetime(str(show.start_time))
+            "artist_name"      : show.artist_name,
+            "artist_image_link": show.artist_image_link,
+            "start_time"       : start_time
         }
         response_data.append(show_data)
 
-  return render_template('pages/shows.html', shows=response_data)
+  # The pager keeps the page size the user asked for; url_for leaves out a None limit
+  return render_template('pages/shows.html', shows=response_data,
+                         next_cursor=page['next_cursor'], prev_cursor=page['prev_cursor'],
+                         limit=limit if 'limit' in request.args else None)
 
 @app.route('/shows/create')
 def create_shows():
@@ -726,28 +740,22 @@ def create_show_submission():
 
   if form.validate():
       try:
-          # Create a new Show object with the form data
-          # Retrieve the maximum ID value from the database table
-          max_id = db.session.query(db.func.max(Show.id)).scalar()
-
-          # Increment the maximum ID value by 1 to generate the ID for the new venue
-          new_id = max_id + 1 if max_id is not None else 1
-        
-        
-          # Create a new Show object with the form data
+          # Create a new Show object with the form data.
+          # The ID is assigned by the database sequence on insert.
           show = Show(
-              id=new_id,
               artist_id =form.artist_id.data,
               venue_id =form.venue_id.data,
               start_time =form.start_time.data
           )
 
-          # Add the show to the database
+          # Add the show to the database. Read the ID before the commit expires the object.
           db.session.add(show)
+          db.session.flush()
+          show_id = show.id
           db.session.commit()
 
           # on successful db insert, flash success
-          flash('Form id' + str(new_id) + ' was successfully listed!')
+          flash('Form id ' + str(show_id) + ' was successfully listed!')
         
           return render_template('pages/home.html')
       except Exception as e:
@@ -756,7 +764,7 @@ def create_show_submission():
           # Print the exception error
           print(str(e))
           # Flash error message
-          flash('An error occurred. Form id ' + str(new_id) + ' could not be listed.')
+          flash('An error occurred. Show could not be listed.')
   else:
       for field, errors in form.errors.items():
           for error in errors:
@@ -764,6 +772,121 @@ def create_show_submission():
 
   return render_template('forms/new_show.html', form=form)
 
+@app.route('/shows/create/bulk', methods=['GET'])
+def create_shows_bulk():
+  # renders the form listing many shows of one artist at one venue
+  form = BulkShowForm()
+  return render_template('forms/new_shows.html', form=form)
+
+@app.route('/shows/create/bulk', methods=['POST'])
+def create_shows_bulk_submission():
+  # lists every show of a recurrence rule or a list of start times in one transaction, see scheduling.py
+  form = BulkShowForm(request.form)
+  conflicts = None
+
+  if form.validate():
+      try:
+          # Get the start times, then check and insert them all at once
+          start_times = scheduling.start_times(form.rule.data.strip(), form.start_time.data, form.start_times.data,
+                                               limit=app.config.get('BULK_SHOWS_MAX', scheduling.MAX_SHOWS))
+          rows, created = scheduling.schedule_shows(form.artist_id.data, form.venue_id.data, start_times,
+                                                    skip_conflicts=form.skip_conflicts.data)
+      except scheduling.ScheduleError as e:
+          db.session.rollback()
+          flash('Shows could not be listed: ' + str(e))
+      except Exception as e:
+          # Rollback the changes if an error occurs
+          db.session.rollback()
+          # Print the exception error
+          print(str(e))
+          # Flash error message
+          flash('An error occurred. Shows could not be listed.')
+      else:
+          # Only the conflicting rows are reported
+          conflicting = [row for row in rows if row['conflict'] is not None]
+          start_times = format_datetimes([row['start_time'] for row in conflicting], 'full')
+          conflicts = [{'start_time': start_time, 'conflict': row['conflict']}
+                       for row, start_time in zip(conflicting, start_times)]
+          if created:
+              flash(f'{created} shows were successfully listed!')
+          if conflicts and form.skip_conflicts.data:
+              flash(f'{len(conflicts)} conflicting shows were skipped.')
+          elif conflicts:
+              flash(f'{len(conflicts)} shows conflict with other shows. Nothing was listed.')
+  else:
+      for field, errors in form.errors.items():
+          for error in errors:
+              flash(f'Validate error: {field} {error}')
+
+  return render_template('forms/new_shows.html', form=form, conflicts=conflicts)
+
+#  Export
+#  ----------------------------------------------------------------
+
+@app.route('/export/<table>.<fmt>')
+@replicas.read_only
+def export_table(table, fmt):
+  # streams a whole table as CSV or NDJSON, e.g. /export/shows.csv?from=2035-01-01&city=San Francisco
+
+  if fmt not in export.FORMATS:
+      abort(404)
+
+  try:
+      query, names = export.export_query(table, request.args)
+  except export.ExportError as e:
+      abort(404 if table not in export.TABLES else 400, str(e))
+
+  if fmt == 'csv':
+      lines, mimetype = export.csv_lines(query, names), 'text/csv'
+  else:
+      lines, mimetype = export.ndjson_lines(query, names), 'application/x-ndjson'
+
+  # Rows are encoded while they are read from the cursor, the request context keeps the session open
+  return Response(stream_with_context(lines), mimetype=mimetype,
+                  headers={'Content-Disposition': f'attachment; filename={table}.{fmt}'})
+
+#  Stats
+#  ----------------------------------------------------------------
+
+def stats_endpoint(view):
+  # The stats expose the internals of a worker: they only answer with
+  # STATS_ENDPOINTS set, and are a 404 otherwise. Neither debug mode, on in
+  # config.py, nor the client address, localhost for every request behind a
+  # reverse proxy, tells a private server from a public one.
+  @wraps(view)
+  def wrapper(*args, **kwargs):
+    if not app.config.get('STATS_ENDPOINTS'):
+      abort(404)
+    return view(*args, **kwargs)
+  return wrapper
+
+#  Page cache
+#  ----------------------------------------------------------------
+
+@app.route('/cache/stats')
+@stats_endpoint
+def page_cache_stats():
+  # hit/miss counters and size of this worker's page cache
+  return jsonify(app.extensions['page_cache'].stats())
+
+#  Connection pool
+#  ----------------------------------------------------------------
+
+@app.route('/pool/stats')
+@stats_endpoint
+def pool_stats():
+  # connections in use and checkout waits of this worker's pool
+  return jsonify(pool.stats(db.engine))
+
+#  Read replicas
+#  ----------------------------------------------------------------
+
+@app.route('/replicas/stats')
+@stats_endpoint
+def replica_stats():
+  # health, lag and pool of each read replica, as last checked by this worker
+  return jsonify(replicas.stats(app))
+
 @app.errorhandler(404)
 def not_found_error(error):
     return render_template('errors/404.html'), 404
@@ -0,0 +1,328 @@
+import gzip
+import json
+import os
+import threading
+from collections import namedtuple
+from datetime import datetime, timedelta
+from functools import lru_cache
+from itertools import groupby
+
+import click
+from flask import current_app
+from flask.cli import AppGroup
+
+from models import Show, db
+
+#----------------------------------------------------------------------------#
+# Cold archive of old shows.
+#----------------------------------------------------------------------------#
+
+# `flask archive shows` moves the shows that started before a cutoff,
+# ARCHIVE_AFTER_DAYS ago by default, out of the Show table into gzipped
+# NDJSON files under ARCHIVE_DIR:
+#
+#     venues/<venue id>-<run>-<n>.ndjson.gz     {"id", "start_time", "artist_id"} per line
+#     artists/<artist id>-<run>-<n>.ndjson.gz   {"id", "start_time", "venue_id"} per line
+#     manifest.json                             the cutoff and the segments of each owner
+#
+# The archived shows of a venue or artist are split in segments of up to
+# SEGMENT_SHOWS shows, most recent first. The manifest lists the segments
+# of each owner with the (start_time, id) of their newest and oldest show,
+# so a page deep in the past opens the one segment it starts in. Segment
+# files are never rewritten: a run writes new files, replaces the manifest
+# and then removes the files the old manifest listed.
+#
+# The past sections of the venue and artist pages, their fragments and the
+# API read a segment only once paging walks past the shows left in the
+# table (queries._section_page): the first pages never touch the archive.
+# The show counters keep counting archived shows, which are still listed,
+# but /shows no longer lists them. Every worker must see the same
+# ARCHIVE_DIR.
+#
+# Only the shows written to the archive are deleted, by id, after the
+# files. A run that fails half way leaves shows both in the table and in
+# the archive; readers skip the duplicates and the next run rewrites them
+# once.
+
+MANIFEST = 'manifest.json'
+
+# Shows per segment file
+SEGMENT_SHOWS = 500
+
+# Ids per DELETE statement
+DELETE_BATCH = 1000
+
+# (kind, owner column, column of the other side of the show)
+OWNERS = (
+    ('venues', 'venue_id', 'artist_id'),
+    ('artists', 'artist_id', 'venue_id'),
+)
+OTHER = {kind: other for kind, _, other in OWNERS}
+
+# A segment file with the (start_time, id) of its first and last show
+Segment = namedtuple('Segment', 'file newest oldest shows')
+
+_manifests = {}
+_manifests_lock = threading.Lock()
+
+
+def _directory():
+    return current_app.config['ARCHIVE_DIR']
+
+
+def _path(kind, file):
+    return os.path.join(_directory(), kind, file)
+
+
+def _key(value):
+    # (start_time, id) of a manifest bound or of a row of a segment file
+    start_time, show_id = value
+    return datetime.fromisoformat(start_time), show_id
+
+
+def _empty():
+    return {'cutoff': None, 'venues': {}, 'artists': {}}
+
+
+def manifest():
+    """{'cutoff': datetime or None, 'venues': {id: [Segment]}, 'artists': {id: [Segment]}}.
+
+    Segments are listed most recent first. Read again only when the file changes.
+    """
+    path = os.path.join(_directory(), MANIFEST)
+    try:
+        mtime = os.stat(path).st_mtime_ns
+    except FileNotFoundError:
+        return _empty()
+
+    with _manifests_lock:
+        cached = _manifests.get(path)
+    if cached is None or cached[0] != mtime:
+        with open(path) as file:
+            data = json.load(file)
+        result = {'cutoff': datetime.fromisoformat(data['cutoff'])}
+        for kind in OTHER:
+            result[kind] = {
+                int(owner_id): [Segment(segment['file'], _key(segment['newest']), _key(segment['oldest']),
+                                        segment['shows']) for segment in segments]
+                for owner_id, segments in data[kind].items()
+            }
+        cached = mtime, result
+        with _manifests_lock:
+            _manifests[path] = cached
+    return cached[1]
+
+
+def cutoff():
+    """Every show that started before this datetime is archived; None without an archive."""
+    return manifest()['cutoff']
+
+
+def archived_counts(kind):
+    """{owner id: shows archived} of the venues or the artists."""
+    return {owner_id: sum(segment.shows for segment in segments)
+            for owner_id, segments in manifest()[kind].items()}
+
+
+def _read(path):
+    with gzip.open(path, 'rt', encoding='utf-8') as file:
+        return [json.loads(line) for line in file]
+
+
+@lru_cache(maxsize=256)
+def _segment(path, other):
+    # The parsed segment as a tuple of (start_time, id, other id), most
+    # recent first. Segment files never change, their path is the key.
+    return tuple((datetime.fromisoformat(row['start_time']), row['id'], row[other]) for row in _read(path))
+
+
+def _first_before(items, before, key):
+    # Index of the first of `items`, sorted by descending key, whose key
+    # sorts before `before`; len(items) if there is none
+    low, high = 0, len(items)
+    while low < high:
+        middle = (low + high) // 2
+        if key(items[middle]) < before:
+            high = middle
+        else:
+            low = middle + 1
+    return low
+
+
+def past_shows(kind, owner_id, before=None, limit=None):
+    """Archived shows of a venue or artist, most recent first.
+
+    `kind` is 'venues' or 'artists', `before` an exclusive (start_time, id)
+    boundary. Returns up to `limit` (start_time, id, other id) tuples, the
+    other id being the artist of a venue's show and the venue of an
+    artist's.
+    """
+    try:
+        return _past_shows(kind, owner_id, before, limit)
+    except FileNotFoundError:
+        # A run replaced the segments after the manifest was read
+        return _past_shows(kind, owner_id, before, limit)
+
+
+def _past_shows(kind, owner_id, before, limit):
+    segments = manifest()[kind].get(owner_id, [])
+    # Segments wholly at or after the boundary are skipped unread
+    index = 0 if before is None else _first_before(segments, before, key=lambda segment: segment.oldest)
+
+    result = []
+    for segment in segments[index:]:
+        rows = _segment(_path(kind, segment.file), OTHER[kind])
+        start = 0 if before is None else _first_before(rows, before, key=lambda row: row[:2])
+        result += rows[start:start + limit - len(result) if limit is not None else None]
+        if limit is not None and len(result) >= limit:
+            break
+        # The next segments are older than the boundary
+        before = None
+    return result
+
+
+def _write(path, write):
+    # Readers only ever see a complete file
+    temporary = f'{path}.tmp'
+    write(temporary)
+    os.replace(temporary, path)
+
+
+def _write_segments(kind, owner_id, shows, segments, run):
+    # Returns the segments of an owner holding `shows` and those archived
+    # before. Shows newer than everything archived only add segments in
+    # front; otherwise (a show inserted late with an old start time, or
+    # left over by a run that did not finish) the owner's segments are
+    # written again, each show once.
+    other = OTHER[kind]
+    shows.sort(key=lambda row: _key((row['start_time'], row['id'])), reverse=True)
+    if segments and _key((shows[-1]['start_time'], shows[-1]['id'])) <= segments[0].newest:
+        ids = {show['id'] for show in shows}
+        shows += [row for segment in segments for row in _read(_path(kind, segment.file)) if row['id'] not in ids]
+        shows.sort(key=lambda row: _key((row['start_time'], row['id'])), reverse=True)
+        segments = []
+
+    written = []
+    for number, start in enumerate(range(0, len(shows), SEGMENT_SHOWS)):
+        chunk = shows[start:start + SEGMENT_SHOWS]
+        file = f'{owner_id}-{run}-{number}.ndjson.gz'
+
+        def write(temporary):
+            with gzip.open(temporary, 'wt', encoding='utf-8') as out:
+                for row in chunk:
+                    out.write(json.dumps({'id': row['id'], 'start_time': row['start_time'], other: row[other]}) + '\n')
+        _write(_path(kind, file), write)
+        written.append(Segment(file, _key((chunk[0]['start_time'], chunk[0]['id'])),
+                               _key((chunk[-1]['start_time'], chunk[-1]['id'])), len(chunk)))
+    return written + segments
+
+
+def _write_manifest(new_cutoff, segments):
+    def bound(key):
+        return [key[0].isoformat(), key[1]]
+
+    data = {'cutoff': new_cutoff.isoformat()}
+    for kind, owners in segments.items():
+        data[kind] = {owner_id: [{'file': segment.file, 'newest': bound(segment.newest),
+                                  'oldest': bound(segment.oldest), 'shows': segment.shows}
+                                 for segment in owner_segments]
+                      for owner_id, owner_segments in owners.items()}
+
+    def write(temporary):
+        with open(temporary, 'w') as file:
+            json.dump(data, file)
+    _write(os.path.join(_directory(), MANIFEST), write)
+
+
+def archive_shows(before, batch_size=1000):
+    """Move the shows that started before `before` to the archive.
+
+    Returns the number of shows moved. The counters are left as they are,
+    archived shows are still listed on the pages of their venue and artist.
+    """
+    if before > datetime.now():
+        raise ValueError('only shows in the past can be archived')
+
+    current = manifest()
+    segments = {kind: dict(current[kind]) for kind in OTHER}
+    run = datetime.now().strftime('%Y%m%dT%H%M%S%f')
+
+    # Both passes read the same snapshot on PostgreSQL, and a show updated
+    # meanwhile makes the DELETE fail instead of losing the update
+    if db.engine.dialect.name == 'postgresql':
+        db.session.connection(execution_options={'isolation_level': 'REPEATABLE READ'})
+
+    # One pass over the old shows per owner type, in owner order, so each
+    # owner gets its segments once
+    archived = None
+    for kind, owner, other in OWNERS:
+        os.makedirs(os.path.join(_directory(), kind), exist_ok=True)
+        rows = db.session.query(getattr(Show, owner), Show.id, Show.start_time, getattr(Show, other))\
+            .filter(Show.start_time < before)\
+            .order_by(getattr(Show, owner))\
+            .yield_per(batch_size)
+        written = set()
+        for owner_id, shows in groupby(rows, key=lambda row: row[0]):
+            shows = [{'id': row[1], 'start_time': row[2].isoformat(), other: row[3]} for row in shows]
+            written.update(show['id'] for show in shows)
+            segments[kind][owner_id] = _write_segments(kind, owner_id, shows, segments[kind].get(owner_id, []), run)
+        # Only the shows written to both sides leave the table
+        archived = written if archived is None else archived & written
+
+    # A later run with an earlier date does not move the cutoff back
+    new_cutoff = max(before, current['cutoff']) if current['cutoff'] is not None else before
+    _write_manifest(new_cutoff, segments)
+
+    # Deleting by id never removes a show committed after the shows were
+    # read, which is in no file. A bulk DELETE skips the ORM events, so the
+    # counters stay untouched.
+    moved = 0
+    archived = sorted(archived)
+    for start in range(0, len(archived), DELETE_BATCH):
+        moved += db.session.query(Show)\
+            .filter(Show.id.in_(archived[start:start + DELETE_BATCH]))\
+            .filter(Show.start_time < before)\
+            .delete(synchronize_session=False)
+    db.session.commit()
+
+    # The segments replaced by this run
+    kept = {(kind, segment.file) for kind in OTHER for owner in segments[kind].values() for segment in owner}
+    for kind in OTHER:
+        for owner in current[kind].values():
+            for segment in owner:
+                if (kind, segment.file) not in kept:
+                    os.remove(_path(kind, segment.file))
+    return moved
+
+
+#----------------------------------------------------------------------------#
+# Commands.
+#----------------------------------------------------------------------------#
+
+archive_cli = AppGroup('archive', help='Move old shows to the cold archive.')
+
+
+@archive_cli.command('shows')
+@click.option('--before', type=click.DateTime(formats=['%Y-%m-%d', '%Y-%m']),
+              help='Archive the shows that started before this date; defaults to ARCHIVE_AFTER_DAYS days ago.')
+def shows_command(before):
+    """Move old shows out of the Show table. Run it periodically."""
+    if before is None:
+        before = datetime.now() - timedelta(days=current_app.config['ARCHIVE_AFTER_DAYS'])
+    try:
+        moved = archive_shows(before)
+    except ValueError as error:
+        raise click.ClickException(str(error))
+    click.echo(f'Archived {moved} shows that started before {before:%Y-%m-%d}.')
+
+
+@archive_cli.command('stats')
+def stats_command():
+    """Show the cutoff and size of the archive."""
+    current = manifest()
+    if current['cutoff'] is None:
+        click.echo(f'No archive in {_directory()}.')
+        return
+    click.echo(f'Shows before {current["cutoff"]:%Y-%m-%d %H:%M} are archived in {_directory()}: '
+               f'{sum(archived_counts("venues").values())} shows of {len(current["venues"])} venues '
+               f'and {len(current["artists"])} artists.')
@@ -0,0 +1,92 @@
+"""Compare listing a weekly residency one POST /shows/create at a time with one POST /shows/create/bulk.
+
+Both sides list the same number of shows for one artist at one venue and
+report the time taken and the SQL statements run. Runs against a
+temporary SQLite file by default; point --database-url at a local
+PostgreSQL database for realistic numbers:
+
+    python benchmarks/bench_bulk_shows.py --shows 1000
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import event
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from app import app
+from models import Artist, Show, Venue, db
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--shows', type=int, default=500)
+    parser.add_argument('--database-url')
+    args = parser.parse_args()
+
+    database_file = None
+    if args.database_url is None:
+        database_file = tempfile.NamedTemporaryFile(suffix='.db', delete=False).name
+        args.database_url = f'sqlite:///{database_file}'
+    app.config['SQLALCHEMY_DATABASE_URI'] = args.database_url
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    app.config['BULK_SHOWS_MAX'] = max(app.config['BULK_SHOWS_MAX'], args.shows)
+
+    with app.app_context():
+        db.create_all()
+        for _ in range(2):
+            db.session.add(Venue(name='Benchmark Venue', city='San Francisco', state='CA'))
+            db.session.add(Artist(name='Benchmark Artist', city='San Francisco', state='CA'))
+        db.session.commit()
+        venue_ids = [venue.id for venue in Venue.query.order_by(Venue.id.desc()).limit(2)]
+        artist_ids = [artist.id for artist in Artist.query.order_by(Artist.id.desc()).limit(2)]
+
+        statements = [0]
+
+        @event.listens_for(db.engine, 'before_cursor_execute')
+        def count_statement(*args):
+            statements[0] += 1
+
+        first = datetime(2035, 1, 5, 21, 0)
+
+        def run(name, post):
+            statements[0] = 0
+            shows_before = Show.query.count()
+            db.session.remove()
+            start = time.perf_counter()
+            post()
+            elapsed = time.perf_counter() - start
+            created = Show.query.count() - shows_before
+            print(f'{name:<8} {created:>6} shows {elapsed * 1000:>10.1f} ms {statements[0]:>8} statements')
+
+        def single():
+            with app.test_client() as client:
+                for week in range(args.shows):
+                    client.post('/shows/create', data={
+                        'artist_id': artist_ids[0],
+                        'venue_id': venue_ids[0],
+                        'start_time': f'{first + timedelta(weeks=week):%Y-%m-%d %H:%M:%S}'
+                    })
+
+        def bulk():
+            with app.test_client() as client:
+                client.post('/shows/create/bulk', data={
+                    'artist_id': artist_ids[1],
+                    'venue_id': venue_ids[1],
+                    'start_time': f'{first:%Y-%m-%d %H:%M:%S}',
+                    'rule': f'FREQ=WEEKLY;COUNT={args.shows}'
+                })
+
+        run('single', single)
+        run('bulk', bulk)
+
+    if database_file is not None:
+        os.unlink(database_file)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,108 @@
+"""Fire concurrent POST /shows/create requests and count primary key conflicts.
+
+Every request should produce exactly one Show row now that ids come from
+the database sequence; exits with status 1 when a request did not, or any
+database error was raised. Runs against a temporary SQLite file by default;
+point --database-url at a local PostgreSQL database for realistic numbers:
+
+    python benchmarks/bench_concurrent_creates.py --threads 16 --requests 2000
+"""
+import argparse
+import contextlib
+import io
+import os
+import sys
+import tempfile
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+from sqlalchemy import event
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from app import app
+from models import Artist, Show, Venue, db
+
+
+def create_shows(threads, requests):
+    """POST `requests` shows of a new venue and artist from `threads` threads.
+
+    Returns (shows created, Counter of database errors by type, seconds).
+    Runs in an app context of an app whose database exists.
+    """
+    # Classify every database error raised while the requests run
+    errors = Counter()
+
+    def count_error(context):
+        errors[type(context.original_exception).__name__] += 1
+    event.listen(db.engine, 'handle_error', count_error)
+
+    venue = Venue(name='Benchmark Venue', city='San Francisco', state='CA')
+    artist = Artist(name='Benchmark Artist', city='San Francisco', state='CA')
+    db.session.add_all([venue, artist])
+    db.session.commit()
+    venue_id, artist_id = venue.id, artist.id
+    db.session.remove()
+
+    def create_show(i):
+        with app.test_client() as client:
+            client.post('/shows/create', data={
+                'artist_id': artist_id,
+                'venue_id': venue_id,
+                'start_time': f'2035-01-01 {i % 24:02d}:00:00'
+            })
+
+    # The views print caught exceptions; keep them out of the report
+    start = time.perf_counter()
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            with ThreadPoolExecutor(max_workers=threads) as executor:
+                list(executor.map(create_show, range(requests)))
+    finally:
+        event.remove(db.engine, 'handle_error', count_error)
+    elapsed = time.perf_counter() - start
+
+    created = Show.query.filter(Show.venue_id == venue_id).count()
+    return created, errors, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--requests', type=int, default=500)
+    parser.add_argument('--database-url')
+    args = parser.parse_args()
+
+    database_file = None
+    if args.database_url is None:
+        database_file = tempfile.NamedTemporaryFile(suffix='.db', delete=False).name
+        args.database_url = f'sqlite:///{database_file}'
+    app.config['SQLALCHEMY_DATABASE_URI'] = args.database_url
+    if args.database_url.startswith('sqlite'):
+        # SQLite serializes writers; let them queue instead of failing fast
+        app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {'connect_args': {'timeout': 60}}
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+
+    with app.app_context():
+        db.create_all()
+        created, errors, elapsed = create_shows(args.threads, args.requests)
+
+    print(f'requests:  {args.requests}')
+    print(f'created:   {created}')
+    print(f'failed:    {args.requests - created}')
+    print(f'pk conflicts: {errors["IntegrityError"] + errors["UniqueViolation"]}')
+    for name, count in sorted(errors.items()):
+        print(f'  {name}: {count}')
+    print(f'writes/s:  {created / elapsed:.1f}')
+
+    if database_file is not None:
+        os.unlink(database_file)
+
+    if created != args.requests or errors:
+        sys.exit(1)
+    print('Every request created its show.')
+
+
+if __name__ == '__main__':
+    main()
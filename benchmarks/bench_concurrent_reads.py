@@ -0,0 +1,104 @@
+"""Compare detail-page throughput with and without CONCURRENT_QUERIES.
+
+Seeds a dataset with scripts/generate_data.py, then fetches /venues/<id> and
+/artists/<id> from --threads client threads, first with the page queries run
+one after the other, then with queries.concurrently running them side by
+side. Reports requests/s, latency percentiles and peak Python memory for
+each mode. SQLite serializes much of the work, so point --database-url at a
+local PostgreSQL database for realistic numbers (it is DROPPED and
+recreated, use a scratch database):
+
+    python benchmarks/bench_concurrent_reads.py --threads 16 --requests 2000
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+from argparse import Namespace
+from concurrent.futures import ThreadPoolExecutor
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, '..'))
+sys.path.insert(0, os.path.join(HERE, '..', 'scripts'))
+
+import generate_data
+from app import app
+from models import db
+
+SIZE = {'venues': 200, 'artists': 1000, 'shows': 20000}
+
+
+def percentile(sorted_values, fraction):
+    index = min(len(sorted_values) - 1, int(round(fraction * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def run(concurrent, threads, requests):
+    app.config['CONCURRENT_QUERIES'] = concurrent
+    urls = [f'/venues/{i % SIZE["venues"] + 1}' if i % 2 else f'/artists/{i % SIZE["artists"] + 1}'
+            for i in range(requests)]
+
+    def fetch(url):
+        start = time.perf_counter()
+        with app.test_client() as client:
+            status = client.get(url).status_code
+        assert status == 200, f'{url} answered {status}'
+        return time.perf_counter() - start
+
+    tracemalloc.start()
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        latencies = sorted(executor.map(fetch, urls))
+    elapsed = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    return {
+        'requests_s': requests / elapsed,
+        'p50_ms': percentile(latencies, 0.5) * 1000,
+        'p95_ms': percentile(latencies, 0.95) * 1000,
+        'peak_kb': peak / 1024,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--requests', type=int, default=500)
+    parser.add_argument('--database-url', help='scratch database, dropped before seeding')
+    args = parser.parse_args()
+
+    database_file = None
+    if args.database_url is None:
+        database_file = tempfile.NamedTemporaryFile(suffix='.db', delete=False).name
+        args.database_url = f'sqlite:///{database_file}'
+    app.config['SQLALCHEMY_DATABASE_URI'] = args.database_url
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    if not args.database_url.startswith('sqlite'):
+        # Every client thread holds a connection, plus two per request for the concurrent sections
+        app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {'pool_size': args.threads * 3}
+    # Measure the queries, not the page cache answering repeated requests
+    app.config['PAGE_CACHE'] = False
+
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        generate_data.Generator(Namespace(
+            seed=0, upcoming_ratio=0.2, past_years=10, future_years=2, chunk_size=50000, **SIZE
+        )).run()
+        db.session.remove()
+
+    print(f"{'mode':<12} {'requests/s':>11} {'p50 ms':>8} {'p95 ms':>8} {'peak KB':>9}")
+    for name, concurrent in (('sequential', False), ('concurrent', True)):
+        result = run(concurrent, args.threads, args.requests)
+        print(f"{name:<12} {result['requests_s']:>11.1f} {result['p50_ms']:>8.2f} {result['p95_ms']:>8.2f} "
+              f"{result['peak_kb']:>9.1f}")
+
+    if database_file is not None:
+        os.unlink(database_file)
+
+
+if __name__ == '__main__':
+    main()
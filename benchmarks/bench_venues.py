@@ -0,0 +1,98 @@
+"""Benchmark the /venues directory against growing numbers of venues.
+
+Compares the old grouping (a linear scan over the areas seen so far for
+every venue row) with queries.venue_areas(), which groups in a dict keyed by
+(city, state). Runs against an in-memory SQLite database:
+
+    python benchmarks/bench_venues.py --sizes 1000 5000 20000
+"""
+import argparse
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from app import app
+from models import Show, Venue, db
+from queries import venue_areas
+
+
+def seed(num_venues, shows_per_venue=4):
+    # One area for every ten venues keeps the number of areas growing with the data
+    db.drop_all()
+    db.create_all()
+    now = datetime.now()
+    db.session.bulk_insert_mappings(Venue, [{
+        'id': i,
+        'name': f'Venue {i}',
+        'city': f'City {i // 10}',
+        'state': 'CA'
+    } for i in range(1, num_venues + 1)])
+    db.session.execute(Show.__table__.insert(), [{
+        'id': i,
+        'venue_id': random.randint(1, num_venues),
+        'artist_id': 1,
+        'start_time': now + timedelta(days=random.randint(-365, 365))
+    } for i in range(1, num_venues * shows_per_venue + 1)])
+    db.session.commit()
+
+
+def old_venue_areas():
+    # The /venues implementation this benchmark replaces
+    venues = Venue.query.with_entities(
+            Venue.city,
+            Venue.state,
+            Venue.id,
+            Venue.name,
+            db.func.count(Show.id).label('num_upcoming_shows')
+        )\
+        .outerjoin(Show, Venue.id == Show.venue_id)\
+        .group_by(Venue.id, Venue.name, Venue.city, Venue.state)\
+        .all()
+    response_data = []
+    for venue in venues:
+        existing_data = next((data for data in response_data if data['city'] == venue.city and data['state'] == venue.state), None)
+        if existing_data is None:
+            existing_data = {'city': venue.city, 'state': venue.state, 'venues': []}
+            response_data.append(existing_data)
+        existing_data['venues'].append({
+            'id': venue.id,
+            'name': venue.name,
+            'num_upcoming_shows': venue.num_upcoming_shows
+        })
+    return response_data
+
+
+def best_of(func, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        list(func())
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 5000, 20000])
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite://'
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    random.seed(0)
+
+    print(f"{'venues':>8} {'old ms':>10} {'new ms':>10} {'new us/venue':>14}")
+    with app.app_context():
+        for size in args.sizes:
+            seed(size)
+            old = best_of(old_venue_areas, args.repeat)
+            new = best_of(venue_areas, args.repeat)
+            print(f'{size:>8} {old * 1000:>10.1f} {new * 1000:>10.1f} {new / size * 1e6:>14.2f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,150 @@
+"""Check that the key routes read Show, Venue and the genre tables through their indexes.
+
+Seeds a dataset with scripts/generate_data.py, requests each route through
+the Flask test client, and asks the database for the plan of every SELECT
+the route ran. A route fails when none of its plans uses the index it
+relies on. Full scans of Show are reported as well.
+
+    python benchmarks/check_indexes.py
+    python benchmarks/check_indexes.py --database-url postgresql://localhost/fyyur_bench
+
+Runs against a temporary SQLite file by default. --database-url points it
+at a scratch PostgreSQL database instead, which is DROPPED and recreated;
+there the plans are taken with sequential scans disabled, so a small
+dataset still tells whether an index can serve the query.
+"""
+import argparse
+import os
+import sys
+import tempfile
+
+from sqlalchemy import event
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, '..'))
+
+from app import app
+from models import db
+from routes import seed
+
+# (route, url, indexes its statements must use between them, indexes
+# checked on PostgreSQL only). SQLite materializes the nested join that
+# eager-loads the genres of a detail page, scanning the association table;
+# PostgreSQL flattens it.
+CHECKS = [
+    ('venues', '/venues', {'ix_Venue_state_city_name'}, set()),
+    ('shows', '/shows', {'ix_Show_start_time'}, set()),
+    ('show_venue', '/venues/1', {'ix_Show_venue_id_start_time'}, {'ix_VenueGenre_venue_id'}),
+    ('venue_shows_fragment', '/venues/1/shows?kind=past', {'ix_Show_venue_id_start_time'}, set()),
+    ('show_artist', '/artists/1', {'ix_Show_artist_id_start_time'}, {'ix_ArtistGenre_artist_id'}),
+    ('artist_shows_fragment', '/artists/1/shows?kind=past', {'ix_Show_artist_id_start_time'}, set()),
+    ('api_venues', '/api/v1/venues?fields=id,genres', {'ix_VenueGenre_venue_id'}, set()),
+    ('api_artists', '/api/v1/artists?fields=id,genres', {'ix_ArtistGenre_artist_id'}, set()),
+]
+
+
+def explain(engine, statement, parameters):
+    """The plan of `statement` as a list of lines."""
+    connection = engine.raw_connection()
+    try:
+        cursor = connection.cursor()
+        if engine.dialect.name == 'postgresql':
+            cursor.execute('SET LOCAL enable_seqscan = off')
+            cursor.execute(f'EXPLAIN {statement}', parameters)
+            return [row[0] for row in cursor.fetchall()]
+        cursor.execute(f'EXPLAIN QUERY PLAN {statement}', parameters)
+        return [row[-1] for row in cursor.fetchall()]
+    finally:
+        connection.rollback()
+        connection.close()
+
+
+def partition_indexes(engine):
+    """{index of a partition: index of the partitioned table} on PostgreSQL.
+
+    Plans over a partitioned Show name the indexes of its partitions.
+    """
+    if engine.dialect.name != 'postgresql':
+        return {}
+    return dict(engine.execute("""
+        SELECT child.relname, parent.relname
+        FROM pg_inherits
+        JOIN pg_class child ON child.oid = pg_inherits.inhrelid
+        JOIN pg_class parent ON parent.oid = pg_inherits.inhparent
+        WHERE child.relkind = 'i'
+    """).fetchall())
+
+
+def full_scans_of_show(plan):
+    # "SCAN Show" without an index on SQLite, "Seq Scan on "Show"" or on one
+    # of its partitions on PostgreSQL
+    return [line.strip() for line in plan
+            if ('SCAN Show' in line and 'USING' not in line) or 'Seq Scan on "Show' in line]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--size', default='small', help='dataset of benchmarks/routes.py')
+    parser.add_argument('--database-url', help='scratch database, dropped before seeding')
+    args = parser.parse_args()
+
+    database_file = None
+    if args.database_url is None:
+        database_file = tempfile.NamedTemporaryFile(suffix='.db', delete=False).name
+        args.database_url = f'sqlite:///{database_file}'
+    app.config['SQLALCHEMY_DATABASE_URI'] = args.database_url
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    # Every request must reach the database
+    app.config['PAGE_CACHE'] = False
+
+    failures = []
+    with app.app_context():
+        seed(args.size)
+        db.session.remove()
+        engine = db.engine
+        parents = partition_indexes(engine)
+
+        statements = []
+
+        @event.listens_for(engine, 'before_cursor_execute')
+        def collect(conn, cursor, statement, parameters, context, executemany):
+            if statement.lstrip().upper().startswith(('SELECT', 'WITH')) and not executemany:
+                statements.append((statement, parameters))
+
+        for name, url, expected, postgresql_expected in CHECKS:
+            if engine.dialect.name == 'postgresql':
+                expected = expected | postgresql_expected
+            statements.clear()
+            with app.test_client() as client:
+                response = client.get(url)
+                # Streamed pages query while their body is read
+                response.get_data()
+                status = response.status_code
+            event.remove(engine, 'before_cursor_execute', collect)
+            plans = [explain(engine, statement, parameters) for statement, parameters in statements]
+            event.listen(engine, 'before_cursor_execute', collect)
+
+            text = '\n'.join(line for plan in plans for line in plan)
+            used = text + '\n' + '\n'.join(parent for child, parent in parents.items() if child in text)
+            missing = sorted(index for index in expected if index not in used)
+            scans = [scan for plan in plans for scan in full_scans_of_show(plan)]
+            verdict = 'ok' if status == 200 and not missing else 'FAIL'
+            print(f'{name:<24} {verdict:<5} {len(statements)} statements')
+            if status != 200:
+                failures.append(f'{name}: status {status}')
+            for index in missing:
+                print(f'  not used: {index}')
+                failures.append(f'{name}: {index} not used')
+            for scan in scans:
+                print(f'  full scan: {scan}')
+
+    if database_file is not None:
+        os.unlink(database_file)
+
+    if failures:
+        sys.exit(1)
+    print('Every route uses its indexes.')
+
+
+if __name__ == '__main__':
+    main()
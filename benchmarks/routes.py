@@ -0,0 +1,254 @@
+"""Route-level benchmark suite with a tracked baseline.
+
+Seeds datasets of several sizes with scripts/generate_data.py, drives every
+route of app.py through the Flask test client, and records latency
+percentiles, SQL statements per request and peak Python memory per route.
+
+    python benchmarks/routes.py                  # compare with benchmarks/baseline.json
+    python benchmarks/routes.py --update         # record a new baseline
+    python benchmarks/routes.py --sizes small    # one dataset only
+
+Exits with status 1 when a route regresses beyond the thresholds. Runs
+offline against a temporary SQLite file; --database-url points it at a
+local PostgreSQL database instead, which is DROPPED and recreated for each
+dataset, so use a scratch database.
+"""
+import argparse
+import itertools
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+from argparse import Namespace
+
+from sqlalchemy import event
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, '..'))
+sys.path.insert(0, os.path.join(HERE, '..', 'scripts'))
+
+import generate_data
+from app import app
+from models import Venue, db
+
+BASELINE = os.path.join(HERE, 'baseline.json')
+
+SIZES = {
+    'small': {'venues': 200, 'artists': 1000, 'shows': 10000},
+    'medium': {'venues': 2000, 'artists': 10000, 'shows': 100000},
+    'large': {'venues': 10000, 'artists': 50000, 'shows': 1000000},
+}
+
+VENUE_FORM = {
+    'name': 'Benchmark Venue', 'city': 'San Francisco', 'state': 'CA',
+    'address': '1015 Folsom Street', 'phone': '123-123-1234', 'genres': ['Jazz', 'Folk'],
+    'image_link': '', 'facebook_link': '', 'website_link': '', 'seeking_description': ''
+}
+
+ARTIST_FORM = {
+    'name': 'Benchmark Artist', 'city': 'San Francisco', 'state': 'CA',
+    'phone': '326-123-5000', 'genres': ['Jazz'],
+    'image_link': '', 'facebook_link': '', 'website_link': '', 'seeking_description': ''
+}
+
+
+def new_venue():
+    # A venue of its own for each DELETE, created outside the timed request
+    venue = Venue(name='Benchmark Venue', city='San Francisco', state='CA')
+    db.session.add(venue)
+    db.session.commit()
+    return f'/venues/{venue.id}'
+
+
+_bulk_runs = itertools.count()
+
+
+def bulk_shows_form():
+    # A year of weekly shows of its own for each request, so none conflicts
+    # with the shows listed by the previous ones
+    return {
+        'artist_id': '1', 'venue_id': '1', 'rule': 'FREQ=WEEKLY;COUNT=52', 'start_times': '',
+        'start_time': f'{2100 + next(_bulk_runs)}-01-01 20:00:00'
+    }
+
+
+# (name, method, url, form data). Venue and artist 1 are the busiest ones in
+# the generated data. A callable url or form data is called before each
+# request, untimed.
+ROUTES = [
+    ('index', 'GET', '/', None),
+    ('venues', 'GET', '/venues', None),
+    ('artists', 'GET', '/artists', None),
+    ('shows', 'GET', '/shows', None),
+    ('show_venue', 'GET', '/venues/1', None),
+    ('venue_shows_fragment', 'GET', '/venues/1/shows?kind=past', None),
+    ('show_artist', 'GET', '/artists/1', None),
+    ('artist_shows_fragment', 'GET', '/artists/1/shows?kind=past', None),
+    ('search_venues', 'POST', '/venues/search', {'search_term': 'blue'}),
+    ('search_artists', 'POST', '/artists/search', {'search_term': 'band'}),
+    ('create_venue_form', 'GET', '/venues/create', None),
+    ('create_venue_submission', 'POST', '/venues/create', VENUE_FORM),
+    ('edit_venue', 'GET', '/venues/1/edit', None),
+    ('edit_venue_submission', 'POST', '/venues/1/edit', VENUE_FORM),
+    ('delete_venue', 'DELETE', new_venue, None),
+    ('create_artist_form', 'GET', '/artists/create', None),
+    ('create_artist_submission', 'POST', '/artists/create', ARTIST_FORM),
+    ('edit_artist', 'GET', '/artists/1/edit', None),
+    ('edit_artist_submission', 'POST', '/artists/1/edit', ARTIST_FORM),
+    ('create_shows', 'GET', '/shows/create', None),
+    ('create_show_submission', 'POST', '/shows/create',
+     {'artist_id': '1', 'venue_id': '1', 'start_time': '2035-04-01 20:00:00'}),
+    ('create_shows_bulk_submission', 'POST', '/shows/create/bulk', bulk_shows_form),
+    ('export_venues', 'GET', '/export/venues.ndjson', None),
+    ('api_venues', 'GET', '/api/v1/venues', None),
+    ('api_venue', 'GET', '/api/v1/venues/1', None),
+    ('api_shows', 'GET', '/api/v1/shows', None),
+]
+
+
+def percentile(sorted_values, fraction):
+    index = min(len(sorted_values) - 1, int(round(fraction * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def seed(size):
+    db.drop_all()
+    db.create_all()
+    generate_data.Generator(Namespace(
+        seed=0, upcoming_ratio=0.2, past_years=10, future_years=2, chunk_size=50000,
+        **SIZES[size]
+    )).run()
+
+
+def measure(method, url, data, repeat, statements):
+    def prepare():
+        return (url() if callable(url) else url), (data() if callable(data) else data)
+
+    def request(target):
+        # A fresh client per request so flashed messages do not pile up in the session cookie
+        with app.test_client() as client:
+            response = client.open(target[0], method=method, data=target[1])
+            response.get_data()
+            return response.status_code
+
+    # Warm up template and statement caches
+    status = request(prepare())
+
+    timings, counts = [], []
+    for _ in range(repeat):
+        target = prepare()
+        statements[0] = 0
+        start = time.perf_counter()
+        request(target)
+        timings.append(time.perf_counter() - start)
+        counts.append(statements[0])
+
+    target = prepare()
+    tracemalloc.start()
+    request(target)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    timings.sort()
+    return {
+        'status': status,
+        'p50_ms': round(percentile(timings, 0.50) * 1000, 3),
+        'p95_ms': round(percentile(timings, 0.95) * 1000, 3),
+        'p99_ms': round(percentile(timings, 0.99) * 1000, 3),
+        'queries': max(counts),
+        'peak_kb': round(peak / 1024, 1),
+    }
+
+
+def compare(baseline, results, latency_threshold, memory_threshold):
+    # Small absolute differences are noise on any machine
+    regressions = []
+    for size, routes in results.items():
+        for name, current in routes.items():
+            previous = baseline.get(size, {}).get(name)
+            if previous is None:
+                continue
+            if current['queries'] > previous['queries']:
+                regressions.append(f"{size}/{name}: {previous['queries']} -> {current['queries']} queries")
+            # The median is compared, the tail percentiles are too noisy for a gate
+            if (current['p50_ms'] > previous['p50_ms'] * (1 + latency_threshold)
+                    and current['p50_ms'] - previous['p50_ms'] > 2):
+                regressions.append(f"{size}/{name}: p50 {previous['p50_ms']}ms -> {current['p50_ms']}ms")
+            if (current['peak_kb'] > previous['peak_kb'] * (1 + memory_threshold)
+                    and current['peak_kb'] - previous['peak_kb'] > 256):
+                regressions.append(f"{size}/{name}: peak {previous['peak_kb']}KB -> {current['peak_kb']}KB")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', nargs='+', choices=sorted(SIZES), default=['small', 'medium'])
+    parser.add_argument('--repeat', type=int, default=20, help='timed requests per route')
+    parser.add_argument('--database-url', help='scratch database, dropped for every dataset')
+    parser.add_argument('--baseline', default=BASELINE)
+    parser.add_argument('--update', action='store_true', help='write the results as the new baseline')
+    parser.add_argument('--latency-threshold', type=float, default=0.25, help='allowed p50 increase, 0.25 = 25%%')
+    parser.add_argument('--memory-threshold', type=float, default=0.25, help='allowed peak memory increase')
+    args = parser.parse_args()
+
+    database_file = None
+    if args.database_url is None:
+        database_file = tempfile.NamedTemporaryFile(suffix='.db', delete=False).name
+        args.database_url = f'sqlite:///{database_file}'
+    app.config['SQLALCHEMY_DATABASE_URI'] = args.database_url
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    # Measure the rendering, not the page cache answering repeated requests
+    app.config['PAGE_CACHE'] = False
+
+    results = {}
+    with app.app_context():
+        statements = [0]
+
+        @event.listens_for(db.engine, 'before_cursor_execute')
+        def count_statement(*args):
+            statements[0] += 1
+
+        if db.engine.dialect.name == 'sqlite':
+            # Keep fsync out of the write routes, it swamps the app's own time
+            @event.listens_for(db.engine, 'connect')
+            def no_sync(dbapi_connection, connection_record):
+                dbapi_connection.execute('PRAGMA synchronous = OFF')
+
+        for size in args.sizes:
+            seed(size)
+            db.session.remove()
+            results[size] = {}
+            print(f'{size}: {SIZES[size]}')
+            print(f"  {'route':<30} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'queries':>8} {'peak KB':>9}")
+            for name, method, url, data in ROUTES:
+                result = results[size][name] = measure(method, url, data, args.repeat, statements)
+                print(f"  {name:<30} {result['p50_ms']:>8.2f} {result['p95_ms']:>8.2f} {result['p99_ms']:>8.2f} "
+                      f"{result['queries']:>8} {result['peak_kb']:>9.1f}")
+
+    if database_file is not None:
+        os.unlink(database_file)
+
+    if args.update:
+        with open(args.baseline, 'w') as baseline_file:
+            json.dump(results, baseline_file, indent=2, sort_keys=True)
+        print(f'Baseline written to {args.baseline}')
+        return
+
+    if not os.path.exists(args.baseline):
+        print(f'No baseline at {args.baseline}, run with --update to record one')
+        return
+
+    with open(args.baseline) as baseline_file:
+        regressions = compare(json.load(baseline_file), results,
+                              args.latency_threshold, args.memory_threshold)
+    for regression in regressions:
+        print(f'REGRESSION {regression}')
+    if regressions:
+        sys.exit(1)
+    print('No regressions against the baseline.')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,58 @@
+import hashlib
+from functools import wraps
+
+from flask import current_app, make_response, request, session
+
+#----------------------------------------------------------------------------#
+# Conditional GET.
+#----------------------------------------------------------------------------#
+
+# Pages carry an ETag and a Last-Modified computed from the updated_at
+# columns of the rows they show (the versions in queries.py). A browser or
+# CDN revalidating its copy sends them back and gets 304 Not Modified after
+# that one cheap query, without the page queries or the rendering.
+# Cache-Control: no-cache makes clients revalidate on every visit instead
+# of guessing how long a page stays fresh.
+
+
+def etag(fingerprint):
+    return hashlib.sha1(repr(fingerprint).encode()).hexdigest()
+
+
+def _validate(response, fingerprint, last_modified):
+    response.set_etag(etag(fingerprint))
+    if last_modified is not None:
+        response.last_modified = last_modified
+    response.cache_control.no_cache = True
+    return response
+
+
+def conditional(version):
+    """Answer 304 Not Modified instead of running the view when the client's copy is current.
+
+    `version` is called with the view arguments and returns
+    (fingerprint, last_modified), or None to leave the request to the view
+    (a missing row, an invalid cursor). Requests carrying flashed messages
+    always get the page, so the message is shown.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            if session.get('_flashes'):
+                return view(*args, **kwargs)
+
+            validator = version(*args, **kwargs)
+            if validator is None:
+                return view(*args, **kwargs)
+
+            not_modified = _validate(current_app.response_class(), *validator)
+            not_modified.make_conditional(request)
+            if not_modified.status_code == 304:
+                return not_modified
+
+            response = make_response(view(*args, **kwargs))
+            if response.status_code == 200:
+                _validate(response, *validator)
+            return response
+        return wrapper
+    return decorator
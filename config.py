@@ -17,6 +17,64 @@ DB_NAME = os.getenv('DB_NAME', 'fyyur')
 
 SQLALCHEMY_DATABASE_URI = f"postgresql+psycopg2://{DB_USER}:{DB_PASSWORD}@{DB_HOST}/{DB_NAME}"
 
+# Connection pool of each worker process, see pool.py. A worker holds up to
+# DB_POOL_SIZE + DB_MAX_OVERFLOW connections and a request waits at most
+# DB_POOL_TIMEOUT seconds for one.
+DB_POOL_SIZE = int(os.getenv('DB_POOL_SIZE', '5'))
+DB_MAX_OVERFLOW = int(os.getenv('DB_MAX_OVERFLOW', '10'))
+DB_POOL_TIMEOUT = float(os.getenv('DB_POOL_TIMEOUT', '30'))
+# Seconds before a connection is replaced, below the server's idle timeout
+DB_POOL_RECYCLE = int(os.getenv('DB_POOL_RECYCLE', '1800'))
+# Test connections on checkout so a restarted server costs no failed request
+DB_POOL_PRE_PING = os.getenv('DB_POOL_PRE_PING', '1') == '1'
+# Behind pgbouncer in transaction pooling mode: open a connection per
+# checkout and leave the pooling to pgbouncer
+DB_PGBOUNCER = os.getenv('DB_PGBOUNCER', '0') == '1'
+
+# Read replicas serving the read-only views, see replicas.py. Host:port
+# pairs separated by commas, with the credentials and database name above.
+DB_REPLICA_HOSTS = [host.strip() for host in os.getenv('DB_REPLICA_HOSTS', '').split(',') if host.strip()]
+SQLALCHEMY_REPLICA_URIS = [f"postgresql+psycopg2://{DB_USER}:{DB_PASSWORD}@{host}/{DB_NAME}" for host in DB_REPLICA_HOSTS]
+# Replicas further behind the primary than this many seconds are not read
+REPLICA_MAX_LAG = float(os.getenv('REPLICA_MAX_LAG', '5'))
+# Seconds between two health checks of a replica
+REPLICA_CHECK_INTERVAL = float(os.getenv('REPLICA_CHECK_INTERVAL', '10'))
+# Seconds a browser keeps reading from the primary after a write
+REPLICA_STICKY_SECONDS = float(os.getenv('REPLICA_STICKY_SECONDS', '10'))
+
+# Request instrumentation: a Server-Timing header and a JSON log line per
+# request, see instrumentation.py
+INSTRUMENT_REQUESTS = os.getenv('INSTRUMENT_REQUESTS', '0') == '1'
+# Requests slower than this also log their most expensive SQL statements
+SLOW_REQUEST_MS = float(os.getenv('SLOW_REQUEST_MS', '500'))
+
+# Serve /cache/stats, /pool/stats and /replicas/stats. They expose the
+# internals of a worker: keep them off on a public server.
+STATS_ENDPOINTS = os.getenv('STATS_ENDPOINTS', '0') == '1'
+
+# Rendered-page cache, see pagecache.py
+PAGE_CACHE = os.getenv('PAGE_CACHE', '1') == '1'
+# Seconds a page is served before it is rendered again
+PAGE_CACHE_TTL = int(os.getenv('PAGE_CACHE_TTL', '300'))
+# Memory held by the cached pages of one worker
+PAGE_CACHE_MAX_BYTES = int(os.getenv('PAGE_CACHE_MAX_BYTES', str(64 * 1024 * 1024)))
+
+# Run the independent queries of the detail pages side by side on separate
+# connections, see queries.concurrently. A request then holds up to two
+# pooled connections.
+CONCURRENT_QUERIES = os.getenv('CONCURRENT_QUERIES', '0') == '1'
+# Worker threads shared by all requests of a process
+CONCURRENT_QUERY_WORKERS = int(os.getenv('CONCURRENT_QUERY_WORKERS', '8'))
+
+# Cold archive of old shows, see archive.py. The directory must be shared
+# by every worker.
+ARCHIVE_DIR = os.getenv('ARCHIVE_DIR', os.path.join(basedir, 'archive'))
+# Days after its start before `flask archive shows` moves a show to the archive
+ARCHIVE_AFTER_DAYS = int(os.getenv('ARCHIVE_AFTER_DAYS', '730'))
+
+# Most shows listed by one post of /shows/create/bulk, see scheduling.py
+BULK_SHOWS_MAX = int(os.getenv('BULK_SHOWS_MAX', '5000'))
+
 
 # Disable CSRF protection
 WTF_CSRF_ENABLED  = False
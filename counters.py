@@ -0,0 +1,250 @@
+from datetime import datetime
+
+import click
+from flask.cli import AppGroup
+from sqlalchemy import event, inspect
+
+import archive
+from models import Artist, CounterCheckpoint, Show, Venue, db
+
+#----------------------------------------------------------------------------#
+# Show counters.
+#----------------------------------------------------------------------------#
+
+# Venue and Artist carry upcoming_shows_count and past_shows_count so the
+# listing pages can read them per row instead of counting shows.
+#
+# A show counts as upcoming when it starts after the checkpoint stored in
+# CounterCheckpoint, not after the current time. `flask counters rollover`
+# moves the shows that started since from upcoming to past. Until it runs,
+# the pages read the counters through current_counts(), which moves the
+# shows of the owner that started since the checkpoint at read time, so the
+# counts agree with the show lists, which use the current time.
+#
+# Inserts, deletes and updates of Show rows made through the ORM adjust the
+# counters in the same transaction. Writes that bypass the ORM (bulk loads)
+# must be followed by `flask counters rebuild`, or count their shows with
+# count_inserted_shows(). Shows moved to the cold
+# archive (archive.py) still count as past shows.
+
+OWNERS = (
+    (Venue, 'venue_id'),
+    (Artist, 'artist_id'),
+)
+
+
+def _checkpoint(connection):
+    # Share-lock the checkpoint so a concurrent rollover cannot move it while
+    # this transaction classifies a show against it
+    rolled_over_at = connection.execute(
+        db.select([CounterCheckpoint.rolled_over_at])
+        .where(CounterCheckpoint.id == 1)
+        .with_for_update(read=True)
+    ).scalar()
+    return rolled_over_at if rolled_over_at is not None else datetime.now()
+
+
+def _adjust(connection, checkpoint, venue_id, artist_id, start_time, delta):
+    if start_time is None:
+        return
+
+    for model, owner_id in ((Venue, venue_id), (Artist, artist_id)):
+        column = model.upcoming_shows_count if start_time > checkpoint else model.past_shows_count
+        connection.execute(
+            model.__table__.update()
+            .where(model.id == owner_id)
+            .values({column: column + delta})
+        )
+
+
+@event.listens_for(Show, 'after_insert')
+def count_inserted_show(mapper, connection, show):
+    _adjust(connection, _checkpoint(connection),
+            show.venue_id, show.artist_id, show.start_time, 1)
+
+
+@event.listens_for(Show, 'after_delete')
+def count_deleted_show(mapper, connection, show):
+    _adjust(connection, _checkpoint(connection),
+            show.venue_id, show.artist_id, show.start_time, -1)
+
+
+@event.listens_for(Show, 'after_update')
+def count_updated_show(mapper, connection, show):
+    state = inspect(show)
+    old = {}
+    for name in ('venue_id', 'artist_id', 'start_time'):
+        history = state.attrs[name].history
+        old[name] = history.deleted[0] if history.deleted else getattr(show, name)
+
+    new = {name: getattr(show, name) for name in old}
+    if old == new:
+        return
+
+    checkpoint = _checkpoint(connection)
+    _adjust(connection, checkpoint, old['venue_id'], old['artist_id'], old['start_time'], -1)
+    _adjust(connection, checkpoint, new['venue_id'], new['artist_id'], new['start_time'], 1)
+
+
+def count_inserted_shows(connection, venue_id, artist_id, start_times):
+    """Count shows of one venue and one artist inserted outside the ORM.
+
+    One UPDATE per owner, whatever the number of shows.
+    """
+    checkpoint = _checkpoint(connection)
+    upcoming = sum(1 for start_time in start_times if start_time is not None and start_time > checkpoint)
+    past = sum(1 for start_time in start_times if start_time is not None) - upcoming
+
+    for model, owner_id in ((Venue, venue_id), (Artist, artist_id)):
+        connection.execute(
+            model.__table__.update()
+            .where(model.id == owner_id)
+            .values({
+                model.upcoming_shows_count: model.upcoming_shows_count + upcoming,
+                model.past_shows_count: model.past_shows_count + past
+            })
+        )
+
+
+def current_counts(model, now=None):
+    """{'upcoming_shows_count', 'past_shows_count'} column expressions of `model` as of `now`.
+
+    The stored counters, less the shows that started between the checkpoint
+    and `now`, counted through the (owner id, start_time) index of Show.
+    """
+    if now is None:
+        now = datetime.now()
+
+    owner_id = Show.venue_id if model is Venue else Show.artist_id
+    checkpoint = db.select([CounterCheckpoint.rolled_over_at])\
+        .where(CounterCheckpoint.id == 1)\
+        .as_scalar()
+    started = db.select([db.func.count(Show.id)])\
+        .where(owner_id == model.id)\
+        .where(Show.start_time > checkpoint)\
+        .where(Show.start_time <= now)\
+        .as_scalar()
+    return {
+        'upcoming_shows_count': model.upcoming_shows_count - started,
+        'past_shows_count': model.past_shows_count + started
+    }
+
+
+def _lock_checkpoint():
+    # Serializes rollovers and rebuilds against each other and against writes
+    return CounterCheckpoint.query.filter_by(id=1).with_for_update().first()
+
+
+def roll_over(now=None):
+    """Move the shows that started since the last checkpoint to the past counters.
+
+    Returns the number of shows moved.
+    """
+    if now is None:
+        now = datetime.now()
+
+    checkpoint = _lock_checkpoint()
+    if checkpoint is None:
+        # The counters were never built
+        db.session.rollback()
+        return rebuild(now)
+
+    moved = 0
+    for model, owner in OWNERS:
+        owner_id = getattr(Show, owner)
+        rows = db.session.query(owner_id, db.func.count(Show.id))\
+            .filter(Show.start_time > checkpoint.rolled_over_at, Show.start_time <= now)\
+            .group_by(owner_id)\
+            .all()
+        if not rows:
+            continue
+
+        db.session.execute(
+            model.__table__.update()
+            .where(model.id == db.bindparam('owner_id'))
+            .values({
+                model.upcoming_shows_count: model.upcoming_shows_count - db.bindparam('moved'),
+                model.past_shows_count: model.past_shows_count + db.bindparam('moved')
+            }),
+            [{'owner_id': row[0], 'moved': row[1]} for row in rows]
+        )
+        if model is Venue:
+            moved = sum(row[1] for row in rows)
+
+    checkpoint.rolled_over_at = now
+    db.session.commit()
+    return moved
+
+
+def rebuild(now=None):
+    """Recompute every counter from the Show table and the archive.
+
+    Returns the number of shows counted.
+    """
+    if now is None:
+        now = datetime.now()
+
+    checkpoint = _lock_checkpoint()
+    if checkpoint is None:
+        checkpoint = CounterCheckpoint(id=1, rolled_over_at=now)
+        db.session.add(checkpoint)
+
+    # One grouped scan of Show per owner type, then one update per owner
+    # that has shows
+    for model, owner in OWNERS:
+        owner_id = getattr(Show, owner)
+        rows = db.session.query(
+                owner_id,
+                db.func.sum(db.case([(Show.start_time > now, 1)], else_=0)),
+                db.func.sum(db.case([(Show.start_time <= now, 1)], else_=0))
+            )\
+            .group_by(owner_id)\
+            .all()
+
+        # Archived shows are listed among the past ones
+        counts = {row[0]: [row[1], row[2]] for row in rows}
+        for archived_owner_id, shows in archive.archived_counts('venues' if model is Venue else 'artists').items():
+            counts.setdefault(archived_owner_id, [0, 0])[1] += shows
+
+        db.session.execute(model.__table__.update().values({
+            model.upcoming_shows_count: 0,
+            model.past_shows_count: 0
+        }))
+        if counts:
+            db.session.execute(
+                model.__table__.update()
+                .where(model.id == db.bindparam('owner_id'))
+                .values({
+                    model.upcoming_shows_count: db.bindparam('upcoming'),
+                    model.past_shows_count: db.bindparam('past')
+                }),
+                [{'owner_id': owner_id, 'upcoming': upcoming, 'past': past}
+                 for owner_id, (upcoming, past) in counts.items()]
+            )
+
+    checkpoint.rolled_over_at = now
+    db.session.commit()
+    return db.session.query(db.func.count(Show.id))\
+        .filter(Show.start_time.isnot(None))\
+        .scalar()
+
+
+#----------------------------------------------------------------------------#
+# Commands.
+#----------------------------------------------------------------------------#
+
+counters_cli = AppGroup('counters', help='Maintain the venue and artist show counters.')
+
+
+@counters_cli.command('rollover')
+def rollover_command():
+    """Move shows that have started from upcoming to past. Run it periodically."""
+    moved = roll_over()
+    click.echo(f'Moved {moved} shows from upcoming to past.')
+
+
+@counters_cli.command('rebuild')
+def rebuild_command():
+    """Recompute all show counters from scratch."""
+    counted = rebuild()
+    click.echo(f'Rebuilt show counters from {counted} shows.')
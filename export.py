@@ -0,0 +1,128 @@
+import csv
+import io
+import json
+from datetime import datetime
+
+from models import Artist, ArtistGenre, Genre, Show, Venue, VenueGenre, db
+
+#----------------------------------------------------------------------------#
+# Export.
+#----------------------------------------------------------------------------#
+
+# Full table dumps for downstream consumers. Rows are read through a
+# server-side cursor (yield_per) and encoded as they arrive, so a worker
+# holds at most one batch of rows in memory whatever the table size. The
+# CSV layout is the one `flask import-csv` reads.
+
+# Rows fetched from the cursor per round trip
+BATCH_SIZE = 1000
+
+TABLES = {
+    'shows': Show,
+    'venues': Venue,
+    'artists': Artist,
+    'genres': Genre,
+}
+
+FORMATS = ('csv', 'ndjson')
+
+
+class ExportError(ValueError):
+    """Raised for an unknown table or an invalid filter."""
+
+
+def _parse_time(value, name):
+    try:
+        return datetime.fromisoformat(value)
+    except ValueError:
+        raise ExportError(f'{name} must be an ISO 8601 date or datetime')
+
+
+def _has_genre(association, owner_match, genre):
+    return db.exists().where(db.and_(
+        owner_match,
+        association.c.genre_id == Genre.id,
+        Genre.name == genre
+    ))
+
+
+def export_query(table, args):
+    """Build the query for `table` filtered by the request `args`.
+
+    Shows accept `from` and `to` (start_time bounds), `city` (of the venue)
+    and `genre` (of the artist). Venues and artists accept `city` and
+    `genre`.
+    """
+    model = TABLES.get(table)
+    if model is None:
+        raise ExportError(f'unknown table {table}')
+
+    columns = [column for column in model.__table__.columns]
+    query = db.session.query(*columns)
+
+    city = args.get('city')
+    genre = args.get('genre')
+
+    if model is Show:
+        if args.get('from'):
+            query = query.filter(Show.start_time >= _parse_time(args['from'], 'from'))
+        if args.get('to'):
+            query = query.filter(Show.start_time < _parse_time(args['to'], 'to'))
+        if city:
+            query = query.join(Venue, Venue.id == Show.venue_id).filter(Venue.city == city)
+        if genre:
+            query = query.filter(_has_genre(ArtistGenre, ArtistGenre.c.artist_id == Show.artist_id, genre))
+    elif model in (Venue, Artist):
+        if city:
+            query = query.filter(model.city == city)
+        if genre and model is Venue:
+            query = query.filter(_has_genre(VenueGenre, VenueGenre.c.venue_id == Venue.id, genre))
+        elif genre:
+            query = query.filter(_has_genre(ArtistGenre, ArtistGenre.c.artist_id == Artist.id, genre))
+
+    # Keyed order keeps dumps stable between runs
+    return query.order_by(model.id).yield_per(BATCH_SIZE), [column.name for column in columns]
+
+
+def _encode_value(value):
+    if isinstance(value, datetime):
+        return value.isoformat(sep=' ')
+    return value
+
+
+def _encode_csv(value):
+    # Same spelling as PostgreSQL's COPY, so dumps load back with import-csv
+    if value is None:
+        return ''
+    if isinstance(value, bool):
+        return 't' if value else 'f'
+    return _encode_value(value)
+
+
+def csv_lines(query, names):
+    """Yield the rows of `query` as CSV text, one batch of rows per chunk."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(names)
+
+    for count, row in enumerate(query, 1):
+        writer.writerow([_encode_csv(value) for value in row])
+        if count % BATCH_SIZE == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+
+    yield buffer.getvalue()
+
+
+def ndjson_lines(query, names):
+    """Yield the rows of `query` as newline-delimited JSON objects."""
+    chunk = []
+    for row in query:
+        chunk.append(json.dumps(dict(zip(names, map(_encode_value, row)))))
+        if len(chunk) == BATCH_SIZE:
+            yield '\n'.join(chunk) + '\n'
+            chunk = []
+
+    if chunk:
+        yield '\n'.join(chunk) + '\n'
@@ -0,0 +1,60 @@
+from datetime import datetime
+from functools import lru_cache
+
+import babel
+import babel.dates
+import dateutil.parser
+
+#----------------------------------------------------------------------------#
+# Date formatting.
+#----------------------------------------------------------------------------#
+
+# Views hand datetime objects straight to these helpers; nothing is turned
+# into a string and parsed back. The babel pattern and locale are resolved
+# once per (format, locale) and recent results are memoized, since listing
+# pages show many shows starting at the same hour.
+
+DATETIME_FORMATS = {
+    'full': "EEEE MMMM, d, y 'at' h:mma",
+    'medium': "EE MM, dd, y h:mma",
+}
+
+# Formatted values kept per process
+CACHE_SIZE = 4096
+
+
+@lru_cache(maxsize=None)
+def _pattern(format, locale):
+    return babel.dates.parse_pattern(DATETIME_FORMATS.get(format, format)), babel.Locale.parse(locale)
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def _format(value, format, locale):
+    pattern, locale = _pattern(format, locale)
+    return pattern.apply(value, locale)
+
+
+def _to_datetime(value):
+    # Strings are still accepted for templates fed with raw text
+    if isinstance(value, str):
+        try:
+            return datetime.fromisoformat(value)
+        except ValueError:
+            return dateutil.parser.parse(value)
+    return value
+
+
+def format_datetime(value, format='medium', locale='en'):
+    """Format a datetime with a named format ('full', 'medium') or a babel pattern."""
+    return _format(_to_datetime(value), format, locale)
+
+
+def format_datetimes(values, format='medium', locale='en'):
+    """Format a list of datetimes, formatting each distinct value once."""
+    formatted = {}
+    result = []
+    for value in values:
+        if value not in formatted:
+            formatted[value] = format_datetime(value, format, locale)
+        result.append(formatted[value])
+    return result
@@ -0,0 +1,164 @@
+import csv
+import io
+import os
+import time
+from datetime import datetime
+from itertools import islice
+
+import click
+from flask.cli import with_appcontext
+
+import counters
+from models import db
+
+#----------------------------------------------------------------------------#
+# CSV import.
+#----------------------------------------------------------------------------#
+
+# Loads the CSV files written by scripts/to_csv.txt (one per table, with a
+# header row naming the columns). Files are streamed: PostgreSQL receives
+# them through COPY, other backends through batched executemany, so memory
+# stays constant whatever the file size.
+
+# Parents before children so foreign keys are satisfied
+LOAD_ORDER = ('Genre', 'Venue', 'Artist', 'VenueGenre', 'ArtistGenre', 'Show')
+
+# Tables whose id comes from a sequence that must follow the imported ids
+SEQUENCE_TABLES = ('Genre', 'Venue', 'Artist', 'Show')
+
+BATCH_SIZE = 5000
+
+TRUE_VALUES = {'t', 'true', '1', 'y', 'yes'}
+
+
+def _converter(column):
+    # Turn a CSV field into the Python value executemany needs. An empty
+    # field is NULL, as it is for COPY.
+    python_type = column.type.python_type
+
+    if python_type is bool:
+        convert = lambda value: value.lower() in TRUE_VALUES
+    elif python_type is datetime:
+        convert = datetime.fromisoformat
+    else:
+        convert = python_type
+
+    return lambda value: convert(value) if value != '' else None
+
+
+def _copy(connection, table, path):
+    # Stream the file to PostgreSQL; the server parses the CSV
+    with open(path, newline='') as csv_file:
+        columns = next(csv.reader(csv_file))
+        csv_file.seek(0)
+        column_list = ', '.join(f'"{name}"' for name in columns)
+
+        cursor = connection.connection.cursor()
+        cursor.copy_expert(
+            f'COPY "{table.name}" ({column_list}) FROM STDIN WITH (FORMAT csv, HEADER true)',
+            csv_file)
+        return cursor.rowcount
+
+
+def _insert_batches(connection, table, path, batch_size):
+    with open(path, newline='') as csv_file:
+        reader = csv.reader(csv_file)
+        columns = next(reader)
+        converters = [_converter(table.c[name]) for name in columns]
+        insert = table.insert()
+
+        count = 0
+        while True:
+            batch = [
+                {name: convert(value) for name, convert, value in zip(columns, converters, row)}
+                for row in islice(reader, batch_size)
+            ]
+            if not batch:
+                return count
+            connection.execute(insert, batch)
+            count += len(batch)
+
+
+def load_rows(connection, table, columns, rows):
+    """Insert one batch of `rows` (tuples ordered like `columns`) into `table`.
+
+    Uses COPY on PostgreSQL and executemany elsewhere. Returns the row count.
+    """
+    if connection.dialect.name == 'postgresql':
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        for row in rows:
+            writer.writerow(['' if value is None else value for value in row])
+        buffer.seek(0)
+
+        column_list = ', '.join(f'"{name}"' for name in columns)
+        cursor = connection.connection.cursor()
+        cursor.copy_expert(f'COPY "{table.name}" ({column_list}) FROM STDIN WITH (FORMAT csv)', buffer)
+        return cursor.rowcount
+
+    batch = [dict(zip(columns, row)) for row in rows]
+    if batch:
+        connection.execute(table.insert(), batch)
+    return len(batch)
+
+
+def sync_id_sequences(connection):
+    """Move the id sequences past the highest imported id (PostgreSQL only)."""
+    if connection.dialect.name != 'postgresql':
+        return
+
+    for table in SEQUENCE_TABLES:
+        connection.execute(
+            f'SELECT setval(pg_get_serial_sequence(\'"{table}"\', \'id\'), '
+            f'COALESCE(MAX(id), 0) + 1, false) FROM "{table}"')
+
+
+def import_csv(directory, batch_size=BATCH_SIZE, report=None):
+    """Load every <Table>.csv found in `directory` in a single transaction.
+
+    Returns {table name: rows loaded}. `report(table, rows, seconds)` is
+    called after each table.
+    """
+    connection = db.session.connection()
+    use_copy = connection.dialect.name == 'postgresql'
+    loaded = {}
+
+    for name in LOAD_ORDER:
+        path = os.path.join(directory, f'{name}.csv')
+        if not os.path.exists(path):
+            continue
+
+        table = db.metadata.tables[name]
+        start = time.perf_counter()
+        if use_copy:
+            loaded[name] = _copy(connection, table, path)
+        else:
+            loaded[name] = _insert_batches(connection, table, path, batch_size)
+        if report is not None:
+            report(name, loaded[name], time.perf_counter() - start)
+
+    sync_id_sequences(connection)
+    db.session.commit()
+
+    # The rows bypassed the ORM events that maintain the show counters
+    counters.rebuild()
+    return loaded
+
+
+@click.command('import-csv')
+@click.option('--directory', default='scripts', show_default=True,
+              type=click.Path(exists=True, file_okay=False),
+              help='Directory holding Genre.csv, Venue.csv, Artist.csv, ... .')
+@click.option('--batch-size', default=BATCH_SIZE, show_default=True,
+              help='Rows per executemany batch when COPY is not available.')
+@with_appcontext
+def import_csv_command(directory, batch_size):
+    """Bulk load the table CSV files into the database."""
+    def report(table, rows, seconds):
+        click.echo(f'{table:<12} {rows:>10} rows {seconds:>8.2f}s {rows / max(seconds, 1e-9):>12.0f} rows/s')
+
+    start = time.perf_counter()
+    loaded = import_csv(directory, batch_size, report)
+    seconds = time.perf_counter() - start
+    total = sum(loaded.values())
+    click.echo(f'{"total":<12} {total:>10} rows {seconds:>8.2f}s {total / max(seconds, 1e-9):>12.0f} rows/s')
@@ -0,0 +1,230 @@
+import json
+import re
+import time
+
+from flask import current_app, g, has_app_context, request
+from jinja2 import Template
+from sqlalchemy import event
+
+import replicas
+from models import db
+
+#----------------------------------------------------------------------------#
+# Request instrumentation.
+#----------------------------------------------------------------------------#
+
+# Measures where the time of each request goes. SQL statements are timed
+# with cursor events on the engine, waits for a pooled connection by the
+# pool (pool.py), templates by timing their rendering, and what is left is
+# Python. Every request gets a Server-Timing header
+# (shown in the browser's network panel) and one JSON log line. Statements
+# run more than once in a request, the signature of an N+1 query, are
+# counted as repeated; slow requests also log their most expensive
+# statements with the literals redacted.
+#
+# Enabled with INSTRUMENT_REQUESTS in config.py. Streamed pages render after
+# the headers are sent, so their header only covers the work done before
+# the first chunk; the log line is written once the body is complete.
+
+# Statements logged for a slow request
+TOP_STATEMENTS = 5
+
+# Quoted strings and numbers inlined in the SQL text. Bound parameters are
+# never logged.
+LITERALS = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+
+
+def redact(statement):
+    return LITERALS.sub('?', ' '.join(statement.split()))
+
+
+class RequestTimings:
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.db = 0.0
+        self.pool = 0.0
+        self.template = 0.0
+        # sql text -> [executions, seconds]
+        self.statements = {}
+
+    def add_statement(self, statement, seconds):
+        self.db += seconds
+        entry = self.statements.setdefault(statement, [0, 0.0])
+        entry[0] += 1
+        entry[1] += seconds
+
+    def merge(self, other):
+        """Add the database and pool time and the statements of `other`."""
+        self.db += other.db
+        self.pool += other.pool
+        for statement, (executions, seconds) in other.statements.items():
+            entry = self.statements.setdefault(statement, [0, 0.0])
+            entry[0] += executions
+            entry[1] += seconds
+
+    @property
+    def count(self):
+        return sum(executions for executions, _ in self.statements.values())
+
+    @property
+    def repeated(self):
+        return self.count - len(self.statements)
+
+    def breakdown(self):
+        total = time.perf_counter() - self.start
+        return {
+            'total_ms': round(total * 1000, 2),
+            'db_ms': round(self.db * 1000, 2),
+            'pool_ms': round(self.pool * 1000, 2),
+            'template_ms': round(self.template * 1000, 2),
+            'python_ms': round(max(total - self.db - self.pool - self.template, 0) * 1000, 2),
+        }
+
+    def server_timing(self):
+        timing = self.breakdown()
+        return ', '.join([
+            f'db;dur={timing["db_ms"]};desc="{self.count} statements, {self.repeated} repeated"',
+            f'pool;dur={timing["pool_ms"]};desc="connection wait"',
+            f'tpl;dur={timing["template_ms"]};desc="templates"',
+            f'app;dur={timing["python_ms"]};desc="python"',
+            f'total;dur={timing["total_ms"]}',
+        ])
+
+    def top_statements(self, limit=TOP_STATEMENTS):
+        ranked = sorted(self.statements.items(), key=lambda item: item[1][1], reverse=True)
+        return [
+            {'sql': redact(statement), 'executions': executions, 'ms': round(seconds * 1000, 2)}
+            for statement, (executions, seconds) in ranked[:limit]
+        ]
+
+    def repeated_statements(self):
+        return [
+            {'sql': redact(statement), 'executions': executions}
+            for statement, (executions, _) in self.statements.items() if executions > 1
+        ]
+
+
+def _current():
+    return g.get('request_timings') if has_app_context() else None
+
+
+def _render_timer(timings):
+    # Time spent in templates, less the lazy loads they trigger, which are
+    # already counted as database time
+    start, db_start = time.perf_counter(), timings.db
+
+    def stop():
+        timings.template += time.perf_counter() - start - (timings.db - db_start)
+
+    return stop
+
+
+class TimedTemplate(Template):
+
+    def render(self, *args, **kwargs):
+        timings = _current()
+        if timings is None:
+            return super().render(*args, **kwargs)
+
+        stop = _render_timer(timings)
+        try:
+            return super().render(*args, **kwargs)
+        finally:
+            stop()
+
+    def generate(self, *args, **kwargs):
+        # Used by streamed pages, each chunk is timed as it is produced
+        timings = _current()
+        chunks = super().generate(*args, **kwargs)
+        if timings is None:
+            yield from chunks
+            return
+
+        while True:
+            stop = _render_timer(timings)
+            try:
+                chunk = next(chunks)
+            except StopIteration:
+                return
+            finally:
+                stop()
+            yield chunk
+
+
+#----------------------------------------------------------------------------#
+# Hooks.
+#----------------------------------------------------------------------------#
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('query_start_time', []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    seconds = time.perf_counter() - conn.info['query_start_time'].pop()
+    timings = _current()
+    if timings is not None:
+        timings.add_statement(statement, seconds)
+
+
+def _checkout(dbapi_connection, connection_record, connection_proxy):
+    # Left by pool.TimedQueuePool; other pools do not wait
+    timings = _current()
+    if timings is not None:
+        timings.pool += connection_record.info.get('checkout_wait', 0.0)
+
+
+def _listen(engine):
+    if not event.contains(engine, 'before_cursor_execute', _before_cursor_execute):
+        event.listen(engine, 'before_cursor_execute', _before_cursor_execute)
+        event.listen(engine, 'after_cursor_execute', _after_cursor_execute)
+        event.listen(engine, 'checkout', _checkout)
+
+
+def _start_request():
+    # The engines are created lazily and replaced when the database URLs change
+    for engine in [db.engine, *replicas.engines(current_app)]:
+        _listen(engine)
+    g.request_timings = RequestTimings()
+
+
+def _finish_request(response):
+    timings = g.get('request_timings')
+    if timings is None:
+        return response
+    response.headers['Server-Timing'] = timings.server_timing()
+
+    logger = current_app.logger
+    slow_ms = current_app.config.get('SLOW_REQUEST_MS', 500)
+    record = {
+        'method': request.method,
+        'path': request.path,
+        'endpoint': request.endpoint,
+        'status': response.status_code,
+    }
+
+    def log():
+        record.update(timings.breakdown())
+        record['statements'] = timings.count
+        record['repeated_statements'] = timings.repeated
+        if timings.repeated:
+            record['repeated'] = timings.repeated_statements()
+        if record['total_ms'] >= slow_ms:
+            record['top_statements'] = timings.top_statements()
+            logger.warning(json.dumps(record))
+        else:
+            logger.info(json.dumps(record))
+
+    # Streamed bodies are still being rendered at this point
+    response.call_on_close(log)
+    return response
+
+
+def init_app(app):
+    """Instrument the requests of `app` when INSTRUMENT_REQUESTS is set."""
+    if not app.config.get('INSTRUMENT_REQUESTS'):
+        return
+
+    app.jinja_env.template_class = TimedTemplate
+    app.before_request(_start_request)
+    app.after_request(_finish_request)
@@ -0,0 +1,47 @@
+"""search indexes on Venue and Artist
+
+Revision ID: b3c1d2e4f5a6
+Revises: 77bf9cbc670c
+Create Date: 2026-10-18 09:12:41.204518
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b3c1d2e4f5a6'
+down_revision = '77bf9cbc670c'
+branch_labels = None
+depends_on = None
+
+# Must stay identical to search.SEARCH_DOCUMENT
+SEARCH_DOCUMENT = ("to_tsvector('simple', coalesce(name, '') || ' ' || "
+                   "coalesce(city, '') || ' ' || coalesce(state, ''))")
+
+
+def upgrade():
+    # The indexes rely on PostgreSQL extensions, other backends search without them
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+
+    op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    for table in ('Venue', 'Artist'):
+        op.execute(f'CREATE INDEX ix_{table.lower()}_search_document ON "{table}" '
+                   f'USING gin ({SEARCH_DOCUMENT})')
+        op.execute(f'CREATE INDEX ix_{table.lower()}_name_trgm ON "{table}" '
+                   f'USING gin (name gin_trgm_ops)')
+        op.execute(f'CREATE INDEX ix_{table.lower()}_city_trgm ON "{table}" '
+                   f'USING gin (city gin_trgm_ops)')
+        op.execute(f'CREATE INDEX ix_{table.lower()}_state ON "{table}" (state)')
+
+
+def downgrade():
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+
+    for table in ('Artist', 'Venue'):
+        op.drop_index(f'ix_{table.lower()}_state', table_name=table)
+        op.drop_index(f'ix_{table.lower()}_city_trgm', table_name=table)
+        op.drop_index(f'ix_{table.lower()}_name_trgm', table_name=table)
+        op.drop_index(f'ix_{table.lower()}_search_document', table_name=table)
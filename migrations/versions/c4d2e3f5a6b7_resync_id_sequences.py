@@ -0,0 +1,36 @@
+"""resync id sequences with existing rows
+
+Revision ID: c4d2e3f5a6b7
+Revises: b3c1d2e4f5a6
+Create Date: 2026-10-18 10:03:17.882140
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c4d2e3f5a6b7'
+down_revision = 'b3c1d2e4f5a6'
+branch_labels = None
+depends_on = None
+
+TABLES = ('Venue', 'Artist', 'Genre', 'Show')
+
+
+def upgrade():
+    # The id columns are SERIAL, but rows were inserted with explicit ids
+    # (seed data and the old max(id)+1 code), so the sequences lag behind.
+    # Move each sequence past the highest id so inserts can rely on it.
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+
+    for table in TABLES:
+        op.execute(f'CREATE SEQUENCE IF NOT EXISTS "{table}_id_seq" OWNED BY "{table}".id')
+        op.execute(f'ALTER TABLE "{table}" ALTER COLUMN id SET DEFAULT nextval(\'"{table}_id_seq"\')')
+        op.execute(f'SELECT setval(\'"{table}_id_seq"\', COALESCE(MAX(id), 0) + 1, false) FROM "{table}"')
+
+
+def downgrade():
+    # Keeping the sequences is harmless, the old code does not use them
+    pass
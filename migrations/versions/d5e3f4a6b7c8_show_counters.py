@@ -0,0 +1,57 @@
+"""show counters on Venue and Artist
+
+Revision ID: d5e3f4a6b7c8
+Revises: c4d2e3f5a6b7
+Create Date: 2026-10-18 11:26:05.517934
+
+"""
+from datetime import datetime
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd5e3f4a6b7c8'
+down_revision = 'c4d2e3f5a6b7'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    for table in ('Venue', 'Artist'):
+        op.add_column(table, sa.Column('upcoming_shows_count', sa.Integer(), server_default='0', nullable=False))
+        op.add_column(table, sa.Column('past_shows_count', sa.Integer(), server_default='0', nullable=False))
+
+    checkpoint = op.create_table('CounterCheckpoint',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('rolled_over_at', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+
+    # Fill the counters from the existing shows, as `flask counters rebuild` does
+    now = datetime.now()
+    show = sa.table('Show', sa.column('id'), sa.column('start_time'),
+                    sa.column('venue_id'), sa.column('artist_id'))
+    for table, owner in (('Venue', 'venue_id'), ('Artist', 'artist_id')):
+        owner_table = sa.table(table, sa.column('id'),
+                               sa.column('upcoming_shows_count'), sa.column('past_shows_count'))
+
+        def count(time_filter):
+            return sa.select([sa.func.count(show.c.id)])\
+                .where(sa.and_(show.c[owner] == owner_table.c.id, time_filter))\
+                .as_scalar()
+
+        op.execute(owner_table.update().values(
+            upcoming_shows_count=count(show.c.start_time > now),
+            past_shows_count=count(show.c.start_time <= now)
+        ))
+
+    op.bulk_insert(checkpoint, [{'id': 1, 'rolled_over_at': now}])
+
+
+def downgrade():
+    op.drop_table('CounterCheckpoint')
+    for table in ('Artist', 'Venue'):
+        op.drop_column(table, 'past_shows_count')
+        op.drop_column(table, 'upcoming_shows_count')
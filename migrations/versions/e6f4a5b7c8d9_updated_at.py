@@ -0,0 +1,44 @@
+"""updated_at on Venue, Artist and Show
+
+Revision ID: e6f4a5b7c8d9
+Revises: d5e3f4a6b7c8
+Create Date: 2026-10-18 15:02:37.118245
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e6f4a5b7c8d9'
+down_revision = 'd5e3f4a6b7c8'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Same expression as models.utcnow
+    if op.get_bind().dialect.name == 'postgresql':
+        utcnow = sa.text("TIMEZONE('utc', CURRENT_TIMESTAMP)")
+    else:
+        utcnow = sa.text('CURRENT_TIMESTAMP')
+
+    # SQLite cannot add a NOT NULL column with a non-constant default, so the
+    # column is filled first and constrained afterwards
+    for table in ('Venue', 'Artist', 'Show'):
+        op.add_column(table, sa.Column('updated_at', sa.DateTime(), nullable=True))
+        op.execute(sa.table(table, sa.column('updated_at')).update().values(updated_at=utcnow))
+        with op.batch_alter_table(table) as batch_op:
+            batch_op.alter_column('updated_at', existing_type=sa.DateTime(), nullable=False,
+                                  server_default=utcnow)
+
+    op.create_index(op.f('ix_Venue_updated_at'), 'Venue', ['updated_at'], unique=False)
+    op.create_index(op.f('ix_Artist_updated_at'), 'Artist', ['updated_at'], unique=False)
+
+
+def downgrade():
+    op.drop_index(op.f('ix_Artist_updated_at'), table_name='Artist')
+    op.drop_index(op.f('ix_Venue_updated_at'), table_name='Venue')
+    for table in ('Show', 'Artist', 'Venue'):
+        with op.batch_alter_table(table) as batch_op:
+            batch_op.drop_column('updated_at')
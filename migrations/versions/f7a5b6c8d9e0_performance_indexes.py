@@ -0,0 +1,53 @@
+"""indexes on Show, Venue and the genre association tables
+
+Revision ID: f7a5b6c8d9e0
+Revises: e6f4a5b7c8d9
+Create Date: 2026-10-18 17:40:12.639017
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f7a5b6c8d9e0'
+down_revision = 'e6f4a5b7c8d9'
+branch_labels = None
+depends_on = None
+
+# Must stay identical to the indexes declared in models.py
+INDEXES = [
+    ('ix_Show_venue_id_start_time', 'Show', ['venue_id', 'start_time', 'id']),
+    ('ix_Show_artist_id_start_time', 'Show', ['artist_id', 'start_time', 'id']),
+    ('ix_Show_start_time', 'Show', ['start_time', 'id']),
+    ('ix_Venue_state_city_name', 'Venue', ['state', 'city', 'name']),
+    ('ix_VenueGenre_venue_id', 'VenueGenre', ['venue_id', 'genre_id']),
+    ('ix_ArtistGenre_artist_id', 'ArtistGenre', ['artist_id', 'genre_id']),
+]
+
+
+def upgrade():
+    if op.get_bind().dialect.name != 'postgresql':
+        for name, table, columns in INDEXES:
+            op.create_index(name, table, columns, unique=False)
+        return
+
+    # CONCURRENTLY keeps the tables writable while the indexes build, but
+    # cannot run inside a transaction. A build that fails leaves an INVALID
+    # index behind, drop it before running the migration again.
+    with op.get_context().autocommit_block():
+        for name, table, columns in INDEXES:
+            op.create_index(name, table, columns, unique=False, postgresql_concurrently=True)
+        for table in ('Show', 'Venue', 'VenueGenre', 'ArtistGenre'):
+            op.execute(f'ANALYZE "{table}"')
+
+
+def downgrade():
+    if op.get_bind().dialect.name != 'postgresql':
+        for name, table, columns in reversed(INDEXES):
+            op.drop_index(name, table_name=table)
+        return
+
+    with op.get_context().autocommit_block():
+        for name, table, columns in reversed(INDEXES):
+            op.drop_index(name, table_name=table, postgresql_concurrently=True)
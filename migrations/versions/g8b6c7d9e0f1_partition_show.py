@@ -0,0 +1,100 @@
+"""partition Show by month of start_time on PostgreSQL
+
+Revision ID: g8b6c7d9e0f1
+Revises: f7a5b6c8d9e0
+Create Date: 2026-10-18 19:05:48.302716
+
+"""
+from datetime import date, datetime
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'g8b6c7d9e0f1'
+down_revision = 'f7a5b6c8d9e0'
+branch_labels = None
+depends_on = None
+
+# Partitions created after the current month, as partitions.MONTHS_AHEAD
+MONTHS_AHEAD = 12
+
+# Same as f7a5b6c8d9e0, built on the partitioned table
+INDEXES = [
+    ('ix_Show_venue_id_start_time', ['venue_id', 'start_time', 'id']),
+    ('ix_Show_artist_id_start_time', ['artist_id', 'start_time', 'id']),
+    ('ix_Show_start_time', ['start_time', 'id']),
+]
+
+COLUMNS = '''
+    id INTEGER NOT NULL DEFAULT nextval('"Show_id_seq"'),
+    start_time TIMESTAMP WITHOUT TIME ZONE,
+    artist_id INTEGER NOT NULL REFERENCES "Artist" (id),
+    venue_id INTEGER NOT NULL REFERENCES "Venue" (id),
+    updated_at TIMESTAMP WITHOUT TIME ZONE NOT NULL DEFAULT TIMEZONE('utc', CURRENT_TIMESTAMP)
+'''
+
+
+def _next_month(month):
+    return date(month.year + month.month // 12, month.month % 12 + 1, 1)
+
+
+def _replace_show(create_table):
+    # Builds the new Show next to the old one, copies the rows and drops the
+    # old table. The id sequence is handed over, so ids keep counting.
+    op.execute('ALTER TABLE "Show" RENAME TO "Show_old"')
+    for name, columns in INDEXES:
+        op.execute(f'DROP INDEX "{name}"')
+    op.execute('ALTER SEQUENCE "Show_id_seq" OWNED BY NONE')
+
+    create_table()
+    op.execute('INSERT INTO "Show" (id, start_time, artist_id, venue_id, updated_at) '
+               'SELECT id, start_time, artist_id, venue_id, updated_at FROM "Show_old"')
+    op.execute('DROP TABLE "Show_old" CASCADE')
+    op.execute('ALTER SEQUENCE "Show_id_seq" OWNED BY "Show".id')
+
+    for name, columns in INDEXES:
+        op.create_index(name, 'Show', columns, unique=False)
+    op.execute('ANALYZE "Show"')
+
+
+def upgrade():
+    # Other backends keep a single table
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+
+    def create_table():
+        # A unique key on a partitioned table must include the partition
+        # key, and start_time may be NULL, so id is only unique with it
+        op.execute(f'CREATE TABLE "Show" ({COLUMNS}, UNIQUE (id, start_time)) PARTITION BY RANGE (start_time)')
+        op.execute('CREATE TABLE "Show_default" PARTITION OF "Show" DEFAULT')
+
+        # One partition per month from the oldest show to MONTHS_AHEAD
+        # months from now; partition names must match partitions.partition_name
+        oldest = op.get_bind().execute(sa.text('SELECT min(start_time) FROM "Show_old"')).scalar()
+        today = datetime.now()
+        last = date(today.year, today.month, 1)
+        for _ in range(MONTHS_AHEAD):
+            last = _next_month(last)
+
+        month = date((oldest or today).year, (oldest or today).month, 1)
+        while month <= last:
+            op.execute(f'CREATE TABLE "Show_{month:%Y_%m}" PARTITION OF "Show" '
+                       f"FOR VALUES FROM ('{month}') TO ('{_next_month(month)}')")
+            month = _next_month(month)
+
+    _replace_show(create_table)
+
+
+def downgrade():
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+
+    def create_table():
+        op.execute(f'CREATE TABLE "Show" ({COLUMNS}, PRIMARY KEY (id))')
+
+    # Dropping the partitioned table drops its partitions. Detached
+    # partitions stay behind as plain tables.
+
+    _replace_show(create_table)
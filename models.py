@@ -1,6 +1,29 @@
-from flask_sqlalchemy import SQLAlchemy
+from datetime import datetime
 
-db = SQLAlchemy()
+from sqlalchemy import event
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.orm import Session
+from sqlalchemy.sql.expression import FunctionElement
+
+from replicas import ReplicatedSQLAlchemy
+
+db = ReplicatedSQLAlchemy()
+
+
+# The current UTC time as a column default, for rows inserted without the
+# ORM (COPY, bulk loads). CURRENT_TIMESTAMP is already UTC on SQLite.
+class utcnow(FunctionElement):
+    type = db.DateTime()
+
+
+@compiles(utcnow, 'postgresql')
+def _postgresql_utcnow(element, compiler, **kw):
+    return "TIMEZONE('utc', CURRENT_TIMESTAMP)"
+
+
+@compiles(utcnow)
+def _default_utcnow(element, compiler, **kw):
+    return 'CURRENT_TIMESTAMP'
 
 #----------------------------------------------------------------------------#
 # Models.
@@ -12,18 +35,25 @@ db = SQLAlchemy()
 # Define two many-to-many relationship tables: ArtistGenre, VenueGenre
 ArtistGenre = db.Table('ArtistGenre',
     db.Column('genre_id' , db.Integer, db.ForeignKey('Genre.id') , primary_key=True),
-    db.Column('artist_id', db.Integer, db.ForeignKey('Artist.id', ondelete='CASCADE'), primary_key=True)
+    db.Column('artist_id', db.Integer, db.ForeignKey('Artist.id', ondelete='CASCADE'), primary_key=True),
+    # The primary key leads with genre_id; artist pages look up by artist
+    db.Index('ix_ArtistGenre_artist_id', 'artist_id', 'genre_id')
 )
 
 VenueGenre = db.Table('VenueGenre',
     db.Column('genre_id', db.Integer, db.ForeignKey('Genre.id'), primary_key=True),
-    db.Column('venue_id', db.Integer, db.ForeignKey('Venue.id', ondelete='CASCADE'), primary_key=True)
+    db.Column('venue_id', db.Integer, db.ForeignKey('Venue.id', ondelete='CASCADE'), primary_key=True),
+    db.Index('ix_VenueGenre_venue_id', 'venue_id', 'genre_id')
 )
 
 
 # Define the Venue class
 class Venue(db.Model):
     __tablename__ = 'Venue'
+    __table_args__ = (
+        # The /venues directory, grouped by area
+        db.Index('ix_Venue_state_city_name', 'state', 'city', 'name'),
+    )
 
     # Define the columns of the Venue table
     id = db.Column(db.Integer, primary_key=True)
@@ -38,6 +68,15 @@ class Venue(db.Model):
     seeking_description = db.Column(db.String(120))
     image_link = db.Column(db.String(500))
 
+    # Show counters maintained by counters.py
+    upcoming_shows_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    past_shows_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+
+    # Time of the last write to the row, in UTC. Validates the conditional
+    # GETs of the pages showing the row, see conditional.py.
+    updated_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, onupdate=datetime.utcnow,
+                           server_default=utcnow(), index=True)
+
     # Define the relationship with the Genre table through the VenueGenre table
     genres = db.relationship('Genre',\
                               secondary=VenueGenre,\
@@ -67,6 +106,15 @@ class Artist(db.Model):
     seeking_venue = db.Column(db.Boolean, default=False)
     seeking_description = db.Column(db.String(120))
 
+    # Show counters maintained by counters.py
+    upcoming_shows_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    past_shows_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+
+    # Time of the last write to the row, in UTC. Validates the conditional
+    # GETs of the pages showing the row, see conditional.py.
+    updated_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, onupdate=datetime.utcnow,
+                           server_default=utcnow(), index=True)
+
     # Define the relationship with the Show table
     shows = db.relationship('Show', backref='artist', lazy=True)
     
@@ -90,8 +138,18 @@ class Genre(db.Model):
 
     
 # Define the Show class
+# On PostgreSQL the table is partitioned by month of start_time (see
+# partitions.py), where id is only unique together with start_time. The
+# ORM still identifies shows by id alone, which the sequence keeps unique.
 class Show(db.Model):
     __tablename__ = 'Show'
+    __table_args__ = (
+        # The sections of the venue and artist pages, walked in (start_time, id) order
+        db.Index('ix_Show_venue_id_start_time', 'venue_id', 'start_time', 'id'),
+        db.Index('ix_Show_artist_id_start_time', 'artist_id', 'start_time', 'id'),
+        # /shows and the counter rollover
+        db.Index('ix_Show_start_time', 'start_time', 'id'),
+    )
 
     # Define the columns of the Show table
     id = db.Column(db.Integer, primary_key=True)
@@ -103,6 +161,33 @@ class Show(db.Model):
     # Define the relationship with the Venue table 
     venue_id = db.Column(db.Integer, db.ForeignKey('Venue.id'), nullable=False)
 
+    # Time of the last write to the row, in UTC
+    updated_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, onupdate=datetime.utcnow,
+                           server_default=utcnow())
+
     # Define the string representation of a Show object
     def __repr__(self):
         return f'<Show {self.id} artist_id={self.artist_id} venue_id={self.venue_id}>'
+
+
+# Define the CounterCheckpoint class
+class CounterCheckpoint(db.Model):
+    __tablename__ = 'CounterCheckpoint'
+
+    # Single row holding the time the show counters were last rolled over.
+    # Shows starting after it count as upcoming, the others as past.
+    id = db.Column(db.Integer, primary_key=True)
+    rolled_over_at = db.Column(db.DateTime, nullable=False)
+
+    # Define the string representation of a CounterCheckpoint object
+    def __repr__(self):
+        return f'<CounterCheckpoint {self.rolled_over_at}>'
+
+
+# Changing only the genres of a venue or artist issues no UPDATE of its row,
+# so onupdate alone would leave updated_at behind
+@event.listens_for(Session, 'before_flush')
+def touch_updated_at(session, flush_context, instances):
+    for instance in session.dirty:
+        if isinstance(instance, (Venue, Artist, Show)) and session.is_modified(instance):
+            instance.updated_at = datetime.utcnow()
@@ -0,0 +1,278 @@
+import threading
+import time
+from collections import OrderedDict, namedtuple
+from functools import wraps
+
+from flask import current_app, g, has_app_context, make_response, request, session
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+
+from models import Artist, Genre, Show, Venue
+
+#----------------------------------------------------------------------------#
+# Page cache.
+#----------------------------------------------------------------------------#
+
+# Keeps the rendered body of the read pages in memory, keyed by the path
+# and query string. Each page carries tags naming what it shows: 'venue:7'
+# for the pages of venue 7 itself, 'listed-venue:7' for every page listing
+# a show at venue 7 (its name or image), 'venues' for the venue list, and so
+# on. The ORM writes of a transaction are turned into the same tags and the
+# matching pages are dropped when it commits, so editing venue 7 purges
+# /venues/7, /venues and the artist pages showing a show there, while a new
+# show only purges the pages of its own venue and artist.
+#
+# Entries expire after PAGE_CACHE_TTL seconds, which also bounds how long
+# a show stays listed as upcoming once it has started. The least recently
+# used pages are evicted past PAGE_CACHE_MAX_BYTES. The cache lives in each
+# worker process: a write purges the worker that served it, the others
+# catch up within the TTL, as do writes made outside the app (flask
+# counters, import-csv). Pages read from a replica are not stored for
+# REPLICA_MAX_LAG seconds after an invalidation, while the replica may still
+# lack the write.
+
+Page = namedtuple('Page', ['body', 'status', 'content_type', 'headers', 'tags', 'expires'])
+
+# Response headers stored with the body, so cached pages still answer
+# conditional GETs (conditional.py)
+CACHED_HEADERS = ('ETag', 'Last-Modified', 'Cache-Control')
+
+# Pages over this share of the memory cap are not cached
+MAX_PAGE_SHARE = 8
+
+
+class PageCache:
+
+    def __init__(self, max_bytes, ttl):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.pages = OrderedDict()
+        self.tags = {}
+        self.size = 0
+        # Bumped on every invalidation; a page rendered across one is not stored
+        self.generation = 0
+        self.invalidated_at = None
+        self.lock = threading.Lock()
+        self.counts = {'hits': 0, 'misses': 0, 'stores': 0, 'evictions': 0, 'expirations': 0, 'invalidations': 0}
+
+    def get(self, key):
+        with self.lock:
+            page = self.pages.get(key)
+            if page is None:
+                self.counts['misses'] += 1
+                return None
+            if page.expires <= time.monotonic():
+                self._remove(key)
+                self.counts['expirations'] += 1
+                self.counts['misses'] += 1
+                return None
+            self.pages.move_to_end(key)
+            self.counts['hits'] += 1
+            return page
+
+    def set(self, key, body, status, content_type, headers, tags, generation):
+        if len(body) > self.max_bytes // MAX_PAGE_SHARE:
+            return
+
+        with self.lock:
+            if generation != self.generation:
+                return
+            if key in self.pages:
+                self._remove(key)
+            self.pages[key] = Page(body, status, content_type, headers, frozenset(tags), time.monotonic() + self.ttl)
+            self.size += len(body)
+            for tag in tags:
+                self.tags.setdefault(tag, set()).add(key)
+            self.counts['stores'] += 1
+
+            while self.size > self.max_bytes:
+                self._remove(next(iter(self.pages)))
+                self.counts['evictions'] += 1
+
+    def invalidate(self, tags):
+        """Drop the pages carrying any of `tags`. Returns the number dropped."""
+        with self.lock:
+            self.generation += 1
+            self.invalidated_at = time.monotonic()
+            keys = set()
+            for tag in tags:
+                keys.update(self.tags.get(tag, ()))
+            for key in keys:
+                self._remove(key)
+            self.counts['invalidations'] += len(keys)
+            return len(keys)
+
+    def clear(self):
+        with self.lock:
+            self.generation += 1
+            self.invalidated_at = time.monotonic()
+            self.counts['invalidations'] += len(self.pages)
+            self.pages.clear()
+            self.tags.clear()
+            self.size = 0
+
+    def _remove(self, key):
+        page = self.pages.pop(key)
+        self.size -= len(page.body)
+        for tag in page.tags:
+            keys = self.tags.get(tag)
+            keys.discard(key)
+            if not keys:
+                del self.tags[tag]
+
+    def stats(self):
+        with self.lock:
+            lookups = self.counts['hits'] + self.counts['misses']
+            return dict(
+                self.counts,
+                hit_ratio=round(self.counts['hits'] / lookups, 4) if lookups else None,
+                entries=len(self.pages),
+                bytes=self.size,
+                max_bytes=self.max_bytes,
+                ttl=self.ttl
+            )
+
+
+def _cache():
+    if not has_app_context() or not current_app.config.get('PAGE_CACHE'):
+        return None
+    return current_app.extensions.get('page_cache')
+
+
+def tag(*tags):
+    """Add tags to the page being rendered, e.g. tag(f'listed-artist:{show.artist_id}')."""
+    if 'page_tags' in g:
+        g.page_tags.update(tags)
+
+
+def _key():
+    # The query string in a canonical order
+    return request.path, tuple(sorted(request.args.items(multi=True)))
+
+
+def _headers(response):
+    return tuple((name, response.headers[name]) for name in CACHED_HEADERS if name in response.headers)
+
+
+def _capture(cache, key, response, body, tags, generation):
+    # Stores a streamed body once it has been sent in full
+    charset = response.charset
+    chunks = []
+    for chunk in body:
+        chunks.append(chunk.encode(charset) if isinstance(chunk, str) else chunk)
+        yield chunk
+    cache.set(key, b''.join(chunks), response.status_code, response.content_type, _headers(response),
+              tags, generation)
+
+
+def cached(*tags):
+    """Serve the decorated view from the page cache.
+
+    `tags` are the tags known from the URL, formatted with the view
+    arguments ('venue:{venue_id}'); the view adds the tags that depend on
+    its data with tag(). Requests carrying flashed messages
+    bypass the cache, since the layout renders them into the page.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            cache = _cache()
+            if cache is None or session.get('_flashes'):
+                return view(*args, **kwargs)
+
+            key = _key()
+            page = cache.get(key)
+            if page is not None:
+                response = current_app.response_class(page.body, status=page.status, content_type=page.content_type,
+                                                      headers=page.headers)
+                response.headers['X-Cache'] = 'HIT'
+                return response.make_conditional(request)
+
+            if g.get('replica') is not None and cache.invalidated_at is not None and \
+                    time.monotonic() - cache.invalidated_at < current_app.config.get('REPLICA_MAX_LAG', 5):
+                # The replica may not have the write that purged the cache yet
+                return view(*args, **kwargs)
+
+            generation = cache.generation
+            g.page_tags = {name.format(**kwargs) for name in tags}
+            response = make_response(view(*args, **kwargs))
+            response.headers['X-Cache'] = 'MISS'
+            if response.status_code != 200:
+                return response
+
+            if response.is_streamed:
+                response.response = _capture(cache, key, response, response.response, g.page_tags, generation)
+            else:
+                cache.set(key, response.get_data(), response.status_code, response.content_type,
+                          _headers(response), g.page_tags, generation)
+            return response
+        return wrapper
+    return decorator
+
+
+#----------------------------------------------------------------------------#
+# Invalidation.
+#----------------------------------------------------------------------------#
+
+def _show_tags(show):
+    # A show appears on its venue and artist pages, on /shows and in the
+    # upcoming counts of /venues. A moved show also leaves its old pages.
+    tags = {'shows', 'venues'}
+    state = inspect(show)
+    for name, kind in (('venue_id', 'venue'), ('artist_id', 'artist')):
+        for value in state.attrs[name].history.sum():
+            tags.add(f'{kind}:{value}')
+    return tags
+
+
+def _write_tags(instance):
+    if isinstance(instance, Venue):
+        return {f'venue:{instance.id}', f'listed-venue:{instance.id}', 'venues'}
+    if isinstance(instance, Artist):
+        return {f'artist:{instance.id}', f'listed-artist:{instance.id}', 'artists'}
+    if isinstance(instance, Show):
+        return _show_tags(instance)
+    if isinstance(instance, Genre):
+        # Genre names appear on every detail page. Giving a venue or an artist
+        # a genre also marks the genre dirty, which on its own changes no page.
+        state = inspect(instance)
+        if state.deleted or state.attrs.name.history.deleted:
+            return {'*'}
+    return set()
+
+
+def purge_on_commit(session, *tags):
+    """Purge the pages tagged `tags` when `session` commits.
+
+    For writes that bypass the ORM, which the flush events do not see.
+    """
+    session.info.setdefault('page_cache_tags', set()).update(tags)
+
+
+@event.listens_for(Session, 'after_flush')
+def collect_written_tags(session, flush_context):
+    tags = session.info.setdefault('page_cache_tags', set())
+    for instance in list(session.new) + list(session.dirty) + list(session.deleted):
+        tags.update(_write_tags(instance))
+
+
+@event.listens_for(Session, 'after_commit')
+def invalidate_written_pages(session):
+    tags = session.info.pop('page_cache_tags', None)
+    cache = _cache()
+    if not tags or cache is None:
+        return
+    if '*' in tags:
+        cache.clear()
+    else:
+        cache.invalidate(tags)
+
+
+@event.listens_for(Session, 'after_soft_rollback')
+def forget_written_tags(session, previous_transaction):
+    session.info.pop('page_cache_tags', None)
+
+
+def init_app(app):
+    app.extensions['page_cache'] = PageCache(app.config.get('PAGE_CACHE_MAX_BYTES', 64 * 1024 * 1024),
+                                             app.config.get('PAGE_CACHE_TTL', 300))
@@ -0,0 +1,189 @@
+from datetime import date, datetime
+
+import click
+from flask.cli import AppGroup
+from sqlalchemy import text
+
+from models import Artist, Show, Venue, db
+
+#----------------------------------------------------------------------------#
+# Show partitions.
+#----------------------------------------------------------------------------#
+
+# On PostgreSQL the Show table is partitioned by month of start_time
+# (migration g8b6c7d9e0f1): "Show_2035_04" holds the shows of April 2035,
+# and "Show_default" the shows without a start time or outside the monthly
+# partitions. Queries filtering on start_time, like the upcoming sections
+# and the counter rollover, only read the partitions of the months they
+# cover.
+#
+# `flask partitions create` adds the partitions of the coming months ahead
+# of time; run it monthly (e.g. from cron). Shows scheduled further ahead
+# wait in the default partition and move to their own when it is created.
+# `flask partitions detach` takes the partitions of old months out of Show
+# without a mass DELETE: they become plain tables, which can be dumped and
+# dropped. Other backends keep a single Show table, which the commands
+# refuse to work on.
+
+# Partitions created ahead of the current month
+MONTHS_AHEAD = 12
+
+DEFAULT_PARTITION = 'Show_default'
+
+
+def partition_name(month):
+    """Name of the partition holding the shows of `month`; must match the migration."""
+    return f'Show_{month:%Y_%m}'
+
+
+def _month(value):
+    return date(value.year, value.month, 1)
+
+
+def _next_month(month):
+    return date(month.year + month.month // 12, month.month % 12 + 1, 1)
+
+
+def is_partitioned():
+    if db.engine.dialect.name != 'postgresql':
+        return False
+    return db.session.execute(text(
+        "SELECT EXISTS (SELECT 1 FROM pg_partitioned_table WHERE partrelid = '\"Show\"'::regclass)"
+    )).scalar()
+
+
+def partitions():
+    """[(name, first month, month after the last)] of the monthly partitions, oldest first."""
+    rows = db.session.execute(text("""
+        SELECT child.relname, pg_get_expr(child.relpartbound, child.oid)
+        FROM pg_inherits
+        JOIN pg_class child ON child.oid = pg_inherits.inhrelid
+        WHERE pg_inherits.inhparent = '"Show"'::regclass
+    """))
+    result = []
+    for name, bound in rows:
+        # FOR VALUES FROM ('2035-04-01 00:00:00') TO ('2035-05-01 00:00:00')
+        if name == DEFAULT_PARTITION:
+            continue
+        lower, upper = (datetime.strptime(value.split("'")[1], '%Y-%m-%d %H:%M:%S').date()
+                        for value in bound.split(' TO '))
+        result.append((name, lower, upper))
+    return sorted(result, key=lambda partition: partition[1])
+
+
+def create_partitions(ahead=MONTHS_AHEAD, now=None):
+    """Create the missing partitions from the current month to `ahead` months later.
+
+    Shows of those months waiting in the default partition move to the new
+    partition. Returns the names of the partitions created.
+    """
+    if now is None:
+        now = datetime.now()
+
+    existing = {lower for _, lower, _ in partitions()}
+    created = []
+    month = _month(now)
+    for _ in range(ahead + 1):
+        if month not in existing:
+            _create_partition(month)
+            created.append(partition_name(month))
+        month = _next_month(month)
+
+    db.session.commit()
+    return created
+
+
+def _create_partition(month):
+    # A partition cannot be created over rows of the default partition, so
+    # it is filled as a plain table and attached afterwards
+    name, lower, upper = partition_name(month), month, _next_month(month)
+    db.session.execute(text(
+        f'CREATE TABLE "{name}" (LIKE "Show" INCLUDING DEFAULTS INCLUDING CONSTRAINTS)'))
+    db.session.execute(text(f"""
+        WITH moved AS (
+            DELETE FROM "{DEFAULT_PARTITION}"
+            WHERE start_time >= :lower AND start_time < :upper
+            RETURNING *
+        )
+        INSERT INTO "{name}" SELECT * FROM moved
+    """), {'lower': lower, 'upper': upper})
+    # Bounds must be literals before PostgreSQL 12
+    db.session.execute(text(
+        f'ALTER TABLE "Show" ATTACH PARTITION "{name}" FOR VALUES FROM (\'{lower}\') TO (\'{upper}\')'))
+
+
+def detach_partitions(before):
+    """Detach the partitions of the months before `before`.
+
+    The detached tables keep their rows but leave Show, so the past show
+    counters drop by the shows they hold. Returns the names detached.
+    """
+    before = _month(before)
+    if before > _month(datetime.now()):
+        raise ValueError('only the partitions of past months can be detached')
+
+    detached = []
+    for name, lower, upper in partitions():
+        if upper > before:
+            break
+        db.session.execute(text(f'ALTER TABLE "Show" DETACH PARTITION "{name}"'))
+        _uncount(name)
+        detached.append(name)
+
+    db.session.commit()
+    return detached
+
+
+def _uncount(table):
+    # The detached months are in the past, their shows count as past shows.
+    # updated_at moves with the counts, which the page versions are built on.
+    for model, owner in ((Venue, Show.venue_id), (Artist, Show.artist_id)):
+        db.session.execute(text(f"""
+            UPDATE "{model.__tablename__}"
+            SET past_shows_count = past_shows_count - detached.shows,
+                updated_at = TIMEZONE('utc', CURRENT_TIMESTAMP)
+            FROM (SELECT {owner.name} AS owner_id, count(*) AS shows FROM "{table}" GROUP BY {owner.name}) AS detached
+            WHERE "{model.__tablename__}".id = detached.owner_id
+        """))
+
+
+#----------------------------------------------------------------------------#
+# Commands.
+#----------------------------------------------------------------------------#
+
+partitions_cli = AppGroup('partitions', help='Maintain the monthly partitions of the Show table.')
+
+
+def _require_partitioned():
+    if not is_partitioned():
+        raise click.ClickException('Show is not partitioned; run "flask db upgrade" on PostgreSQL.')
+
+
+@partitions_cli.command('list')
+def list_command():
+    """List the monthly partitions of Show."""
+    _require_partitioned()
+    for name, lower, upper in partitions():
+        click.echo(f'{name}  {lower} .. {upper}')
+
+
+@partitions_cli.command('create')
+@click.option('--ahead', default=MONTHS_AHEAD, show_default=True, help='Months to create after the current one.')
+def create_command(ahead):
+    """Create the partitions of the coming months. Run it monthly."""
+    _require_partitioned()
+    created = create_partitions(ahead)
+    click.echo(f'Created {len(created)} partitions{": " + ", ".join(created) if created else "."}')
+
+
+@partitions_cli.command('detach')
+@click.option('--before', required=True, type=click.DateTime(formats=['%Y-%m-%d', '%Y-%m']),
+              help='Detach the months before this one, e.g. 2020-01.')
+def detach_command(before):
+    """Take the partitions of old months out of Show."""
+    _require_partitioned()
+    try:
+        detached = detach_partitions(before)
+    except ValueError as error:
+        raise click.ClickException(str(error))
+    click.echo(f'Detached {len(detached)} partitions{": " + ", ".join(detached) if detached else "."}')
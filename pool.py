@@ -0,0 +1,163 @@
+import threading
+import time
+from weakref import WeakKeyDictionary
+
+from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import event, exc, pool
+
+#----------------------------------------------------------------------------#
+# Connection pool.
+#----------------------------------------------------------------------------#
+
+# Sizes the pool of the PostgreSQL engine from the DB_POOL_* settings of
+# config.py and measures it: how long requests wait for a connection, how
+# many connections are in use and how far the pool overflows. /pool/stats
+# (with STATS_ENDPOINTS) reports the numbers of the worker serving it, and
+# with INSTRUMENT_REQUESTS the wait of each request shows in its
+# Server-Timing header.
+#
+# Behind pgbouncer in transaction pooling mode (DB_PGBOUNCER=1) the app
+# keeps no connections of its own: pgbouncer does the pooling, and a server
+# connection only belongs to the app for one transaction. Nothing may then
+# outlive a transaction, so the app relies on no prepared statements,
+# session settings or WITH HOLD cursors (psycopg2 uses none of them).
+# SQLite keeps the pools chosen by Flask-SQLAlchemy.
+
+# Checkouts slower than this had to wait for a connection
+WAIT_THRESHOLD = 0.001
+
+# Engine -> PoolMetrics
+_metrics = WeakKeyDictionary()
+
+
+class PoolMetrics:
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.checkouts = 0
+        self.waits = 0
+        self.wait_time = 0.0
+        self.max_wait = 0.0
+        self.timeouts = 0
+        self.in_use = 0
+        self.peak_in_use = 0
+
+    def checked_out(self, seconds=None):
+        with self.lock:
+            self.checkouts += 1
+            self.in_use += 1
+            self.peak_in_use = max(self.peak_in_use, self.in_use)
+            if seconds is not None:
+                self.wait_time += seconds
+                self.max_wait = max(self.max_wait, seconds)
+                if seconds >= WAIT_THRESHOLD:
+                    self.waits += 1
+
+    def checked_in(self):
+        with self.lock:
+            self.in_use -= 1
+
+    def timed_out(self):
+        with self.lock:
+            self.timeouts += 1
+
+    def stats(self):
+        with self.lock:
+            return {
+                'checkouts': self.checkouts,
+                'waits': self.waits,
+                'timeouts': self.timeouts,
+                'wait_ms': round(self.wait_time * 1000, 2),
+                'avg_wait_ms': round(self.wait_time * 1000 / self.checkouts, 3) if self.checkouts else None,
+                'max_wait_ms': round(self.max_wait * 1000, 2),
+                'in_use': self.in_use,
+                'peak_in_use': self.peak_in_use,
+            }
+
+
+class TimedQueuePool(pool.QueuePool):
+    """QueuePool timing how long each checkout waits for a connection.
+
+    The wait is left in the connection record's info as 'checkout_wait',
+    where the checkout listeners pick it up.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.metrics = PoolMetrics()
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            record = super()._do_get()
+        except exc.TimeoutError:
+            self.metrics.timed_out()
+            raise
+        record.info['checkout_wait'] = time.perf_counter() - start
+        return record
+
+    def recreate(self):
+        # Keeps counting across a dispose() or an invalidated pool
+        recreated = super().recreate()
+        recreated.metrics = self.metrics
+        return recreated
+
+
+def engine_options(config):
+    """create_engine() arguments for a PostgreSQL engine from the DB_POOL_* settings."""
+    if config.get('DB_PGBOUNCER'):
+        return {'poolclass': pool.NullPool}
+    return {
+        'poolclass': TimedQueuePool,
+        'pool_size': config.get('DB_POOL_SIZE', 5),
+        'max_overflow': config.get('DB_MAX_OVERFLOW', 10),
+        'pool_timeout': config.get('DB_POOL_TIMEOUT', 30),
+        'pool_recycle': config.get('DB_POOL_RECYCLE', 1800),
+        'pool_pre_ping': config.get('DB_POOL_PRE_PING', True),
+    }
+
+
+class PooledSQLAlchemy(SQLAlchemy):
+    """Flask-SQLAlchemy with the engine pool configured and measured by this module.
+
+    SQLALCHEMY_ENGINE_OPTIONS still takes precedence over the DB_POOL_*
+    settings.
+    """
+
+    def apply_driver_hacks(self, app, sa_url, options):
+        super().apply_driver_hacks(app, sa_url, options)
+        if sa_url.drivername.startswith('postgresql'):
+            options.update(engine_options(app.config))
+
+    def create_engine(self, sa_url, engine_opts):
+        engine = super().create_engine(sa_url, engine_opts)
+        # TimedQueuePool brings its own metrics; other pools only count checkouts
+        metrics = _metrics[engine] = getattr(engine.pool, 'metrics', None) or PoolMetrics()
+
+        @event.listens_for(engine.pool, 'checkout')
+        def checkout(dbapi_connection, connection_record, connection_proxy):
+            metrics.checked_out(connection_record.info.get('checkout_wait'))
+
+        @event.listens_for(engine.pool, 'checkin')
+        def checkin(dbapi_connection, connection_record):
+            metrics.checked_in()
+
+        return engine
+
+
+def stats(engine):
+    """Occupancy and checkout counters of the pool of `engine`."""
+    engine_pool = engine.pool
+    result = {'pool': type(engine_pool).__name__}
+    if isinstance(engine_pool, pool.QueuePool):
+        result.update(
+            size=engine_pool.size(),
+            idle=engine_pool.checkedin(),
+            overflow=max(engine_pool.overflow(), 0),
+            max_overflow=engine_pool._max_overflow,
+            timeout_s=engine_pool.timeout(),
+        )
+    metrics = _metrics.get(engine)
+    if metrics is not None:
+        result.update(metrics.stats())
+    return result
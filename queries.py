@@ -0,0 +1,655 @@
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from functools import partial
+from itertools import groupby
+
+from flask import current_app, g
+
+import archive
+import counters
+import reference
+import search
+from instrumentation import RequestTimings
+from models import Artist, ArtistGenre, Show, Venue, VenueGenre, db
+
+#----------------------------------------------------------------------------#
+# Read queries.
+#----------------------------------------------------------------------------#
+
+# The views in app.py render the rows returned here. Each helper issues a
+# fixed number of statements no matter how many rows it returns, so the
+# cost of a page grows with the size of the result and not with the number
+# of lazy loads the template happens to trigger.
+
+# Rows of the /venues directory fetched at a time
+AREA_BATCH = 1000
+
+
+def venue_areas():
+    """Yield the /venues directory grouped by (city, state).
+
+    One statement returns every venue with its upcoming show counter, in
+    area order. Each area is yielded as soon as its last venue is read, so
+    the page streams while the rows arrive instead of after all of them.
+    """
+    rows = db.session.query(
+            Venue.city,
+            Venue.state,
+            Venue.id,
+            Venue.name,
+            counters.current_counts(Venue)['upcoming_shows_count'].label('num_upcoming_shows')
+        )\
+        .order_by(Venue.state, Venue.city, Venue.name)\
+        .yield_per(AREA_BATCH)
+
+    # The venues of an area are consecutive rows
+    for (city, state), venues in groupby(rows, key=lambda row: (row.city, row.state)):
+        yield {
+            'city': city,
+            'state': state,
+            'venues': [{
+                'id': row.id,
+                'name': row.name,
+                'num_upcoming_shows': row.num_upcoming_shows
+            } for row in venues]
+        }
+
+
+def entity_page(model, columns, after=None, limit=50):
+    """Return a page of venues or artists ordered by id, reading only `columns`.
+
+    The id is always selected, `after` is the id of the last row of the
+    previous page. Returns {'rows', 'next_cursor'}.
+    """
+    query = db.session.query(model.id.label('id'), *columns)
+    if after is not None:
+        query = query.filter(model.id > after)
+
+    rows = query.order_by(model.id).limit(limit + 1).all()
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = str(rows[-1].id)
+
+    return {
+        'rows': rows,
+        'next_cursor': next_cursor
+    }
+
+
+def entity_row(model, columns, entity_id):
+    """Return `columns` of one venue or artist, or None."""
+    return db.session.query(model.id.label('id'), *columns)\
+        .filter(model.id == entity_id)\
+        .first()
+
+
+def genre_names(model, ids):
+    """Return {id: [genre names]} for the venues or artists in `ids`.
+
+    Reads the association table only, the names come from the genre
+    registry.
+    """
+    association, owner = (VenueGenre, VenueGenre.c.venue_id) if model is Venue \
+        else (ArtistGenre, ArtistGenre.c.artist_id)
+
+    genre_ids = {owner_id: [] for owner_id in ids}
+    rows = db.session.query(owner, association.c.genre_id)\
+        .filter(owner.in_(ids))\
+        .order_by(owner, association.c.genre_id)
+    for owner_id, genre_id in rows:
+        genre_ids[owner_id].append(genre_id)
+
+    return {owner_id: reference.genres.names(owner_genre_ids) for owner_id, owner_genre_ids in genre_ids.items()}
+
+
+#----------------------------------------------------------------------------#
+# Search.
+#----------------------------------------------------------------------------#
+
+# Maximum number of rows returned by a search. The total number of matches
+# is still reported.
+SEARCH_LIMIT = 50
+
+
+# Columns of a search result by name
+SEARCH_COLUMNS = ('id', 'name', 'num_upcoming_shows')
+
+
+def venue_search(search_term, limit=SEARCH_LIMIT, fields=SEARCH_COLUMNS):
+    """Search venues by name, city and state, most relevant first.
+
+    Only the SEARCH_COLUMNS named in `fields` are read.
+    """
+    return _search(Venue, search_term, limit, fields)
+
+
+def artist_search(search_term, limit=SEARCH_LIMIT, fields=SEARCH_COLUMNS):
+    """Search artists by name, city and state, most relevant first."""
+    return _search(Artist, search_term, limit, fields)
+
+
+def _search(model, search_term, limit, fields):
+    # Returns {'count': total matches, 'data': [(id, name, num_upcoming_shows)]}
+    # from a single statement; the total comes from a window over the matches.
+    criterion, rank = search.match(model, search_term)
+    columns = {
+        'id': model.id,
+        'name': model.name,
+        'num_upcoming_shows': counters.current_counts(model)['upcoming_shows_count'].label('num_upcoming_shows')
+    }
+
+    rows = db.session.query(
+            *[columns[name] for name in SEARCH_COLUMNS if name in fields],
+            db.func.count(model.id).over().label('total')
+        )\
+        .filter(criterion)\
+        .order_by(rank.desc(), model.name, model.id)\
+        .limit(limit)\
+        .all()
+
+    return {
+        'count': rows[0].total if rows else 0,
+        'data': rows
+    }
+
+
+#----------------------------------------------------------------------------#
+# Concurrent queries.
+#----------------------------------------------------------------------------#
+
+# With CONCURRENT_QUERIES set, the independent statements of a page (the
+# header and the show sections of a detail page) run side by side on
+# separate pooled connections, so the page waits for the slowest of them
+# instead of their sum. Each request then holds up to one connection per
+# statement; size the pool accordingly. A request never waits for its
+# workers while holding a connection, or requests holding the whole pool
+# would wait on workers waiting for a connection.
+
+
+def _executor(app):
+    executor = app.extensions.get('query_executor')
+    if executor is None:
+        executor = app.extensions['query_executor'] = ThreadPoolExecutor(
+            max_workers=app.config.get('CONCURRENT_QUERY_WORKERS', 8),
+            thread_name_prefix='query')
+    return executor
+
+
+def concurrently(*calls):
+    """Run the argument-less `calls` side by side and return their results in order.
+
+    The first call runs in the calling thread and the request's session, so
+    it may return ORM objects. The others run in worker threads with their
+    own session, which is closed when they return: they must return plain
+    rows. The request's session is committed before waiting for them, so
+    the calls must only read. Without CONCURRENT_QUERIES the calls run one
+    after the other.
+    """
+    app = current_app._get_current_object()
+    if not app.config.get('CONCURRENT_QUERIES') or len(calls) < 2:
+        return [call() for call in calls]
+
+    # The workers read from the request's replica and see the rows its page
+    # version read. They time their statements apart, the timings are added
+    # to the request's once they are done.
+    shared = {name: g.get(name) for name in ('replica', 'detail_sections') if name in g}
+    timings = g.get('request_timings')
+
+    def run(call):
+        with app.app_context():
+            for name, value in shared.items():
+                setattr(g, name, value)
+            if timings is not None:
+                g.request_timings = RequestTimings()
+            try:
+                return call(), g.get('request_timings')
+            finally:
+                db.session.remove()
+
+    futures = [_executor(app).submit(run, call) for call in calls[1:]]
+    first = calls[0]()
+    _release_connection()
+
+    results = [first]
+    for future in futures:
+        result, worker_timings = future.result()
+        if timings is not None:
+            timings.merge(worker_timings)
+        results.append(result)
+    return results
+
+
+def _release_connection():
+    # Ends the read transaction of the request's session, which hands its
+    # connection back to the pool. The objects it loaded are not expired,
+    # the page goes on rendering them without reading them again.
+    session = db.session()
+    expire_on_commit, session.expire_on_commit = session.expire_on_commit, False
+    try:
+        session.commit()
+    finally:
+        session.expire_on_commit = expire_on_commit
+
+
+#----------------------------------------------------------------------------#
+# Detail pages.
+#----------------------------------------------------------------------------#
+
+# Number of shows rendered inline in each section of a detail page. The
+# rest is fetched page by page from the /venues/<id>/shows and
+# /artists/<id>/shows fragments.
+SHOWS_PER_SECTION = 6
+
+# Rows of the past sections read from the archive, with the same columns as
+# the rows of venue_shows() and artist_shows()
+ArchivedVenueShow = namedtuple('ArchivedVenueShow', 'id start_time artist_id artist_name artist_image_link')
+ArchivedArtistShow = namedtuple('ArchivedArtistShow', 'id start_time venue_id venue_name venue_image_link')
+
+
+def venue_detail(venue_id):
+    """Return (venue, upcoming_shows_count, past_shows_count) or None.
+
+    The genres are joined eagerly, so the whole header of the page is a
+    single statement. The counts are the counters kept by counters.py, as
+    of now.
+    """
+    counts = counters.current_counts(Venue)
+    return db.session.query(
+            Venue,
+            counts['upcoming_shows_count'].label('upcoming_shows_count'),
+            counts['past_shows_count'].label('past_shows_count')
+        )\
+        .options(db.joinedload(Venue.genres))\
+        .filter(Venue.id == venue_id)\
+        .first()
+
+
+def artist_detail(artist_id):
+    """Return (artist, upcoming_shows_count, past_shows_count) or None."""
+    counts = counters.current_counts(Artist)
+    return db.session.query(
+            Artist,
+            counts['upcoming_shows_count'].label('upcoming_shows_count'),
+            counts['past_shows_count'].label('past_shows_count')
+        )\
+        .options(db.joinedload(Artist.genres))\
+        .filter(Artist.id == artist_id)\
+        .first()
+
+
+def venue_shows(venue_id, upcoming, now=None, after=None, limit=SHOWS_PER_SECTION):
+    """Return a page of the upcoming or past shows of a venue.
+
+    The artist columns are joined in. Upcoming shows come soonest first,
+    past shows most recent first; `after` is the next_cursor of the
+    previous page.
+    """
+    if now is None:
+        now = datetime.now()
+
+    query = db.session.query(
+            Show.id,
+            Show.start_time,
+            Show.artist_id,
+            Artist.name.label('artist_name'),
+            Artist.image_link.label('artist_image_link')
+        )\
+        .join(Artist, Artist.id == Show.artist_id)\
+        .filter(Show.venue_id == venue_id)
+    archived = partial(_archived_shows, 'venues', venue_id, Artist, ArchivedVenueShow)
+    return _section_page(query, upcoming, now, after, limit, archived)
+
+
+def artist_shows(artist_id, upcoming, now=None, after=None, limit=SHOWS_PER_SECTION):
+    """Return a page of the upcoming or past shows of an artist.
+
+    The venue columns are joined in; ordering and paging follow
+    venue_shows().
+    """
+    if now is None:
+        now = datetime.now()
+
+    query = db.session.query(
+            Show.id,
+            Show.start_time,
+            Show.venue_id,
+            Venue.name.label('venue_name'),
+            Venue.image_link.label('venue_image_link')
+        )\
+        .join(Venue, Venue.id == Show.venue_id)\
+        .filter(Show.artist_id == artist_id)
+    archived = partial(_archived_shows, 'artists', artist_id, Venue, ArchivedArtistShow)
+    return _section_page(query, upcoming, now, after, limit, archived)
+
+
+def _section_query(query, upcoming, now, after):
+    # Upcoming shows walk forward in time, past shows walk backwards
+    if upcoming:
+        query = query.filter(Show.start_time > now)\
+            .order_by(Show.start_time, Show.id)
+    else:
+        query = query.filter(Show.start_time <= now)\
+            .order_by(Show.start_time.desc(), Show.id.desc())
+
+    if after is not None:
+        start_time, show_id = decode_cursor(after)
+        if upcoming:
+            query = query.filter(db.or_(
+                Show.start_time > start_time,
+                db.and_(Show.start_time == start_time, Show.id > show_id)))
+        else:
+            query = query.filter(db.or_(
+                Show.start_time < start_time,
+                db.and_(Show.start_time == start_time, Show.id < show_id)))
+    return query
+
+
+def _section_page(query, upcoming, now, after, limit, archived):
+    rows = _section_query(query, upcoming, now, after).limit(limit + 1).all()
+    return _page(rows, upcoming, after, limit, archived)
+
+
+def _page(rows, upcoming, after, limit, archived):
+    # The page of a section from up to limit + 1 of its rows, in order
+
+    # Past shows older than the archive cutoff left the table (archive.py).
+    # The archive is only read once the table runs out before the page is
+    # full, or hands out shows older than the cutoff, inserted after the
+    # archive ran, which the archived ones must be sorted with.
+    cutoff = None if upcoming else archive.cutoff()
+    if cutoff is not None and (len(rows) <= limit or rows[-1].start_time < cutoff):
+        before = decode_cursor(after) if after is not None else None
+        merged = {row.id: row for row in archived(before, limit + 1)}
+        merged.update((row.id, row) for row in rows)
+        rows = sorted(merged.values(), key=lambda row: (row.start_time, row.id), reverse=True)[:limit + 1]
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1].start_time, rows[-1].id)
+
+    return {
+        'shows': rows,
+        'next_cursor': next_cursor
+    }
+
+
+# What tells the two detail pages apart: (owner, owner column, listed model,
+# listed column, prefix of the listed columns, archived row type)
+DETAILS = {
+    'venues': (Venue, Show.venue_id, Artist, Show.artist_id, 'artist', ArchivedVenueShow),
+    'artists': (Artist, Show.artist_id, Venue, Show.venue_id, 'venue', ArchivedArtistShow),
+}
+
+
+def _first_sections(kind, owner_id, now):
+    # The first page of both show sections of a detail page with the
+    # updated_at of the owner, of each show and of the venue or artist it
+    # names, in one statement. One row more than a section shows is read,
+    # it decides the "Show more" link. Rows with a NULL id mean no show;
+    # None if there is no such owner.
+    owner, owner_column, listed, listed_column, prefix, _ = DETAILS[kind]
+
+    sections = []
+    for upcoming in (True, False):
+        query = db.session.query(
+                db.literal(upcoming, db.Boolean).label('upcoming'),
+                Show.id,
+                Show.start_time,
+                listed_column.label(f'{prefix}_id'),
+                listed.name.label(f'{prefix}_name'),
+                listed.image_link.label(f'{prefix}_image_link'),
+                Show.updated_at.label('show_updated_at'),
+                listed.updated_at.label('listed_updated_at')
+            )\
+            .join(listed, listed.id == listed_column)\
+            .filter(owner_column == owner_id)
+        query = _section_query(query, upcoming, now, None).limit(SHOWS_PER_SECTION + 1)
+        sections.append(query.subquery().select())
+    shown = db.union_all(*sections).alias()
+
+    rows = db.session.query(owner.updated_at.label('owner_updated_at'), shown)\
+        .select_from(owner)\
+        .outerjoin(shown, db.true())\
+        .filter(owner.id == owner_id)\
+        .all()
+    return rows or None
+
+
+def _sections(kind, owner_id):
+    # The first pages of the sections of a detail page. The rows read for
+    # the version of the page by the same request are reused (conditional.py
+    # runs it first), so the page reads its shows once.
+    memo = g.pop('detail_sections', None)
+    if memo is not None and memo[:2] == (kind, owner_id):
+        rows, known = memo[2:]
+    else:
+        rows, known = _first_sections(kind, owner_id, datetime.now()) or [], {}
+
+    owner, _, listed, _, _, row_type = DETAILS[kind]
+    archived = partial(_archived_shows, kind, owner_id, listed, row_type, known=known)
+    pages = []
+    for upcoming in (True, False):
+        # A UNION does not keep the order of its parts
+        section = sorted((row for row in rows if row.id is not None and row.upcoming == upcoming),
+                         key=lambda row: (row.start_time, row.id), reverse=not upcoming)
+        pages.append(_page(section, upcoming, None, SHOWS_PER_SECTION, archived))
+    return pages
+
+
+def venue_sections(venue_id):
+    """Return the first (upcoming page, past page) of a venue, as venue_shows() pages them."""
+    return _sections('venues', venue_id)
+
+
+def artist_sections(artist_id):
+    """Return the first (upcoming page, past page) of an artist, as artist_shows() pages them."""
+    return _sections('artists', artist_id)
+
+
+def _archived_shows(kind, owner_id, listed, row_type, before, limit, known=None):
+    # Up to `limit` archived past shows of a venue or artist before the
+    # (start_time, id) boundary, with the name and image of the artist or
+    # venue read from the table in one statement. Shows of an artist or a
+    # venue deleted since are left out, as the join of the table leaves them.
+    # `known` maps the ids already read, by the version of the page, to their
+    # row or None.
+    known = {} if known is None else known
+    result = []
+    while len(result) < limit:
+        shows = archive.past_shows(kind, owner_id, before, limit - len(result))
+        if not shows:
+            break
+        _read_listed(listed, {show[2] for show in shows}, known)
+        result += [row_type(show_id, start_time, listed_id, known[listed_id].name, known[listed_id].image_link)
+                   for start_time, show_id, listed_id in shows if known[listed_id] is not None]
+        before = shows[-1][:2]
+    return result
+
+
+def _read_listed(listed, ids, known):
+    # Adds the artists or venues of `ids` missing from `known`, None for
+    # those deleted since
+    missing = ids - known.keys()
+    if missing:
+        known.update(dict.fromkeys(missing))
+        known.update((row.id, row) for row in db.session.query(listed.id, listed.name, listed.image_link, listed.updated_at)
+                     .filter(listed.id.in_(missing)))
+
+
+#----------------------------------------------------------------------------#
+# Keyset pagination.
+#----------------------------------------------------------------------------#
+
+# Pages are addressed by the (start_time, id) of a boundary row instead of an
+# OFFSET, so fetching any page costs an index range scan of `limit` rows no
+# matter how deep into the table it is.
+
+def encode_cursor(start_time, show_id):
+    return f'{start_time.strftime("%Y%m%dT%H%M%S%f")}.{show_id}'
+
+
+def decode_cursor(cursor):
+    """Turn a cursor back into (start_time, id); raises ValueError if malformed."""
+    timestamp, _, show_id = cursor.partition('.')
+    return datetime.strptime(timestamp, '%Y%m%dT%H%M%S%f'), int(show_id)
+
+
+def _shows_query(query, after, before):
+    # Walks backwards from `before`, forwards from `after` or the start
+    query = query.filter(Show.start_time.isnot(None))
+    if before is not None:
+        start_time, show_id = decode_cursor(before)
+        return query.filter(db.or_(
+                Show.start_time < start_time,
+                db.and_(Show.start_time == start_time, Show.id < show_id)))\
+            .order_by(Show.start_time.desc(), Show.id.desc())
+
+    if after is not None:
+        start_time, show_id = decode_cursor(after)
+        query = query.filter(db.or_(
+            Show.start_time > start_time,
+            db.and_(Show.start_time == start_time, Show.id > show_id)))
+    return query.order_by(Show.start_time, Show.id)
+
+
+# Columns of a shows_page() row besides the id and start time, by name
+SHOW_COLUMNS = {
+    'venue_id': Show.venue_id,
+    'venue_name': Venue.name.label('venue_name'),
+    'artist_id': Show.artist_id,
+    'artist_name': Artist.name.label('artist_name'),
+    'artist_image_link': Artist.image_link.label('artist_image_link'),
+}
+
+
+def shows_page(after=None, before=None, limit=50, fields=SHOW_COLUMNS):
+    """Return one page of shows ordered by (start_time, id).
+
+    `after` and `before` are cursors from a previous page. The artist and
+    venue columns are joined into the same statement, so a page costs a
+    single query. Rows hold the id, the start time and the SHOW_COLUMNS
+    named in `fields`; a table none of them reads is not joined.
+    """
+    query = db.session.query(
+            Show.id,
+            Show.start_time,
+            *[column for name, column in SHOW_COLUMNS.items() if name in fields]
+        )
+    if 'venue_name' in fields:
+        query = query.join(Venue, Venue.id == Show.venue_id)
+    if 'artist_name' in fields or 'artist_image_link' in fields:
+        query = query.join(Artist, Artist.id == Show.artist_id)
+    query = _shows_query(query, after, before)
+
+    # Fetch one extra row to know whether another page exists in this direction
+    rows = query.limit(limit + 1).all()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    if before is not None:
+        rows.reverse()
+
+    next_cursor = prev_cursor = None
+    if rows:
+        first, last = rows[0], rows[-1]
+        if before is not None:
+            prev_cursor = encode_cursor(first.start_time, first.id) if has_more else None
+            next_cursor = encode_cursor(last.start_time, last.id)
+        else:
+            next_cursor = encode_cursor(last.start_time, last.id) if has_more else None
+            prev_cursor = encode_cursor(first.start_time, first.id) if after is not None else None
+
+    return {
+        'shows': rows,
+        'next_cursor': next_cursor,
+        'prev_cursor': prev_cursor
+    }
+
+
+#----------------------------------------------------------------------------#
+# Page versions.
+#----------------------------------------------------------------------------#
+
+# Validators for the conditional GETs of conditional.py. Each reads only ids
+# and updated_at columns in a single statement and returns
+# (fingerprint, last_modified), or None when the page does not exist. The
+# fingerprint changes whenever the page would render differently: it holds
+# the updated_at of the rows shown and the ids of the shows listed, which
+# change as shows move from upcoming to past.
+
+
+def _last_modified(updated_at, started_at=()):
+    # updated_at values are naive UTC, show start times naive local time
+    times = [value.replace(tzinfo=timezone.utc) for value in updated_at if value is not None]
+    times += [value.astimezone(timezone.utc) for value in started_at if value is not None]
+    return max(times, default=None)
+
+
+def venues_version():
+    """Version of the /venues directory."""
+    row = db.session.query(db.func.max(Venue.updated_at), db.func.count(Venue.id)).one()
+    return tuple(row), _last_modified([row[0]])
+
+
+def artists_version():
+    """Version of the /artists list."""
+    row = db.session.query(db.func.max(Artist.updated_at), db.func.count(Artist.id)).one()
+    return tuple(row), _last_modified([row[0]])
+
+
+def venue_version(venue_id, now=None):
+    """Version of the page of a venue, or None if there is no such venue."""
+    return _detail_version('venues', venue_id, now)
+
+
+def artist_version(artist_id, now=None):
+    """Version of the page of an artist, or None if there is no such artist."""
+    return _detail_version('artists', artist_id, now)
+
+
+def _detail_version(kind, owner_id, now):
+    # Built on the rows the page shows, which the view then renders
+    # without reading them again (_sections)
+    if now is None:
+        now = datetime.now()
+
+    rows = _first_sections(kind, owner_id, now)
+    if rows is None:
+        return None
+    known = {}
+    g.detail_sections = (kind, owner_id, rows, known)
+
+    # A show listed as past also changed the page when it started
+    past = [row.start_time for row in rows if row.start_time is not None and row.start_time <= now]
+    updated_at = [rows[0].owner_updated_at] + [row.show_updated_at for row in rows] + [row.listed_updated_at for row in rows]
+    version = tuple(tuple(row) for row in rows)
+
+    # A past section completed from the archive (see _page) also changes
+    # with the venues or artists it names
+    cutoff = archive.cutoff()
+    if cutoff is not None and (len(past) <= SHOWS_PER_SECTION or min(past) < cutoff):
+        shows = archive.past_shows(kind, owner_id, limit=SHOWS_PER_SECTION + 1)
+        if shows:
+            # Read with their names, which the past section then reuses
+            _read_listed(DETAILS[kind][2], {show[2] for show in shows}, known)
+            updated_at.append(max((row.updated_at for row in known.values() if row is not None), default=None))
+            version += (tuple(show[1] for show in shows), updated_at[-1])
+
+    return version, _last_modified(updated_at, past)
+
+
+def shows_version(after=None, before=None, limit=50):
+    """Version of a page of /shows; raises ValueError for a malformed cursor."""
+    query = db.session.query(
+            Show.id,
+            Show.updated_at,
+            Venue.updated_at,
+            Artist.updated_at
+        )\
+        .join(Venue, Venue.id == Show.venue_id)\
+        .join(Artist, Artist.id == Show.artist_id)
+    rows = _shows_query(query, after, before).limit(limit + 1).all()
+
+    return tuple(tuple(row) for row in rows), _last_modified(value for row in rows for value in row[1:])
@@ -0,0 +1,107 @@
+import threading
+import time
+
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session, make_transient_to_detached
+
+from models import Genre, db
+
+#----------------------------------------------------------------------------#
+# Reference data.
+#----------------------------------------------------------------------------#
+
+# The genres and states offered by the forms. States are fixed; genres are
+# read from the Genre table on first use and kept in memory, so the forms
+# get their choices and the create/edit views their Genre rows without a
+# query. Genre writes committed through the ORM reload the registry; writes
+# from other processes (import-csv, generate_data) are picked up after
+# RELOAD_AFTER seconds.
+
+STATES = (
+    'AL', 'AK', 'AZ', 'AR', 'CA', 'CO', 'CT', 'DE', 'DC', 'FL', 'GA', 'HI',
+    'ID', 'IL', 'IN', 'IA', 'KS', 'KY', 'LA', 'ME', 'MT', 'NE', 'NV', 'NH',
+    'NJ', 'NM', 'NY', 'NC', 'ND', 'OH', 'OK', 'OR', 'MD', 'MA', 'MI', 'MN',
+    'MS', 'MO', 'PA', 'RI', 'SC', 'SD', 'TN', 'TX', 'UT', 'VT', 'VA', 'WA',
+    'WV', 'WI', 'WY',
+)
+
+STATE_CHOICES = [(state, state) for state in STATES]
+
+# Seconds before the genres are read again
+RELOAD_AFTER = 300
+
+
+class GenreRegistry:
+
+    def __init__(self):
+        self.ids_by_name = {}
+        self.names_by_id = {}
+        self.loaded_at = None
+        self.lock = threading.Lock()
+
+    def _current(self):
+        with self.lock:
+            if self.loaded_at is None or time.monotonic() - self.loaded_at > RELOAD_AFTER:
+                rows = db.session.query(Genre.id, Genre.name).order_by(Genre.id).all()
+                # Swapped whole, readers never see a half-built mapping
+                self.ids_by_name = {name: genre_id for genre_id, name in rows}
+                self.names_by_id = {genre_id: name for genre_id, name in rows}
+                self.loaded_at = time.monotonic()
+            return self.ids_by_name, self.names_by_id
+
+    def reload(self):
+        """Read the genres again on next use."""
+        self.loaded_at = None
+
+    def choices(self):
+        """(value, label) pairs for a SelectMultipleField, in table order."""
+        return [(name, name) for name in self._current()[0]]
+
+    def names(self, ids):
+        names_by_id = self._current()[1]
+        return [names_by_id[genre_id] for genre_id in ids if genre_id in names_by_id]
+
+    def objects(self, names):
+        """Genre rows for `names`, attached to the session without a query.
+
+        Meant for assigning Venue.genres and Artist.genres: the association
+        rows are written from the ids alone. Unknown names are skipped.
+        """
+        ids_by_name = self._current()[0]
+        genres = []
+        for name in names:
+            genre_id = ids_by_name.get(name)
+            if genre_id is None:
+                continue
+            genre = db.session.identity_map.get(db.session.identity_key(Genre, genre_id))
+            if genre is None:
+                genre = Genre(id=genre_id, name=name)
+                make_transient_to_detached(genre)
+                db.session.add(genre)
+            genres.append(genre)
+        return genres
+
+
+genres = GenreRegistry()
+
+
+@event.listens_for(Session, 'after_flush')
+def note_genre_writes(session, flush_context):
+    for instance in list(session.new) + list(session.dirty) + list(session.deleted):
+        # Giving a venue or an artist a genre also marks the genre dirty
+        if isinstance(instance, Genre) and (
+                instance in session.new or instance in session.deleted
+                or inspect(instance).attrs.name.history.deleted):
+            session.info['genres_written'] = True
+            return
+
+
+@event.listens_for(Session, 'after_commit')
+def reload_written_genres(session):
+    if session.info.pop('genres_written', False):
+        genres.reload()
+
+
+@event.listens_for(Session, 'after_soft_rollback')
+def forget_genre_writes(session, previous_transaction):
+    session.info.pop('genres_written', None)
@@ -0,0 +1,215 @@
+import threading
+import time
+from functools import wraps
+
+from flask import current_app, g, has_app_context, has_request_context, session
+from flask_sqlalchemy import SignallingSession
+from sqlalchemy import event, exc, orm, text
+from sqlalchemy.engine.url import make_url
+from sqlalchemy.orm import Session
+
+from pool import PooledSQLAlchemy, stats as pool_stats
+
+#----------------------------------------------------------------------------#
+# Read replicas.
+#----------------------------------------------------------------------------#
+
+# Views marked read_only run their queries on one of the read replicas of
+# SQLALCHEMY_REPLICA_URIS, picked in turn for each request; everything else
+# goes to the primary. A session holding pending changes always uses the
+# primary, and so does the rest of a request once it has committed.
+#
+# Replicas are checked every REPLICA_CHECK_INTERVAL seconds, by the request
+# that finds the check due: one that cannot be reached, or that replays
+# the primary's writes more than REPLICA_MAX_LAG seconds late, is left out
+# until a later check finds it back. With no replica in service reads go
+# to the primary.
+#
+# A replica may not have replayed a write yet when the browser follows the
+# redirect after it. The browser that wrote therefore reads from the
+# primary for REPLICA_STICKY_SECONDS, noted in its session cookie.
+
+LAG_QUERY = text("""
+    SELECT CASE
+        WHEN NOT pg_is_in_recovery() THEN 0
+        WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+        ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)
+    END
+""")
+
+
+class Replica:
+
+    def __init__(self, uri, engine):
+        self.uri = uri
+        self.engine = engine
+        self.healthy = False
+        self.lag = None
+        self.error = None
+        self.checked_at = None
+
+    def check(self):
+        try:
+            with self.engine.connect() as connection:
+                if self.engine.dialect.name == 'postgresql':
+                    self.lag = float(connection.execute(LAG_QUERY).scalar())
+                else:
+                    connection.execute(text('SELECT 1'))
+                    self.lag = 0.0
+        except exc.DBAPIError as error:
+            self.healthy, self.lag, self.error = False, None, str(error.orig)
+            current_app.logger.warning('Replica %r is unreachable: %s', self.engine.url, self.error)
+        else:
+            self.healthy, self.error = True, None
+
+
+class ReplicaSet:
+
+    def __init__(self, db):
+        self.db = db
+        self.uris = ()
+        self.replicas = []
+        self.turn = 0
+        self.lock = threading.Lock()
+
+    def _create_engine(self, app, uri):
+        # Same options as the primary engine (pool.py)
+        sa_url, options = make_url(uri), {}
+        self.db.apply_pool_defaults(app, options)
+        self.db.apply_driver_hacks(app, sa_url, options)
+        options.update(app.config['SQLALCHEMY_ENGINE_OPTIONS'])
+        if sa_url.drivername.startswith('postgresql') and 'connect_args' not in options:
+            # A replica that went away must not hold requests on connect
+            options['connect_args'] = {'connect_timeout': app.config.get('REPLICA_CONNECT_TIMEOUT', 2)}
+        return self.db.create_engine(sa_url, options)
+
+    def _current(self, app):
+        # The engines are created on first use and replaced when the URIs change
+        uris = tuple(app.config.get('SQLALCHEMY_REPLICA_URIS') or ())
+        with self.lock:
+            if uris != self.uris:
+                for replica in self.replicas:
+                    replica.engine.dispose()
+                self.replicas = [Replica(uri, self._create_engine(app, uri)) for uri in uris]
+                self.uris = uris
+            return self.replicas
+
+    def engines(self, app):
+        return [replica.engine for replica in self._current(app)]
+
+    def choose(self, app):
+        """The engine of the next replica in service, or None to read from the primary."""
+        replicas = self._current(app)
+        if not replicas:
+            return None
+
+        now = time.monotonic()
+        interval = app.config.get('REPLICA_CHECK_INTERVAL', 10)
+        with self.lock:
+            due = [replica for replica in replicas
+                   if replica.checked_at is None or now - replica.checked_at >= interval]
+            # Other requests keep the last known state meanwhile
+            for replica in due:
+                replica.checked_at = now
+        for replica in due:
+            replica.check()
+
+        max_lag = app.config.get('REPLICA_MAX_LAG', 5)
+        usable = [replica for replica in replicas if replica.healthy and replica.lag <= max_lag]
+        if not usable:
+            return None
+        with self.lock:
+            self.turn += 1
+            return usable[self.turn % len(usable)].engine
+
+    def stats(self):
+        return [{
+            'url': repr(replica.engine.url),
+            'healthy': replica.healthy,
+            'lag_s': replica.lag,
+            'error': replica.error,
+            'pool': pool_stats(replica.engine),
+        } for replica in self.replicas]
+
+
+#----------------------------------------------------------------------------#
+# Routing.
+#----------------------------------------------------------------------------#
+
+class RoutingSession(SignallingSession):
+
+    def get_bind(self, mapper=None, clause=None):
+        replica = g.get('replica') if has_app_context() else None
+        if replica is not None and not self._flushing and self._is_clean():
+            return replica
+        return super().get_bind(mapper, clause)
+
+
+class ReplicatedSQLAlchemy(PooledSQLAlchemy):
+    """Flask-SQLAlchemy with sessions reading from the replicas in read_only views."""
+
+    def init_app(self, app):
+        super().init_app(app)
+        app.extensions['replicas'] = ReplicaSet(self)
+
+    def create_session(self, options):
+        return orm.sessionmaker(class_=RoutingSession, db=self, **options)
+
+
+def _sticky():
+    return has_request_context() and session.get('primary_until', 0) > time.time()
+
+
+def use_replica():
+    """Send the reads of the current request to a replica, unless the browser has just written."""
+    if not current_app.config.get('SQLALCHEMY_REPLICA_URIS') or _sticky():
+        return
+    g.replica = current_app.extensions['replicas'].choose(current_app)
+
+
+def read_only(view):
+    """Run the queries of the decorated view on a read replica.
+
+    Goes above pagecache.cached and conditional, so their queries are
+    routed as well.
+    """
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        use_replica()
+        return view(*args, **kwargs)
+    return wrapper
+
+
+def engines(app):
+    """The engines of the replicas of `app`."""
+    return app.extensions['replicas'].engines(app)
+
+
+def stats(app):
+    """Health, lag and pool of each replica of `app`."""
+    return app.extensions['replicas'].stats()
+
+
+def note_write(db_session):
+    """Mark a write that bypasses the ORM, so the commit sticks the browser to the primary."""
+    db_session.info['replicas_written'] = True
+
+
+@event.listens_for(Session, 'after_flush')
+def note_writes(db_session, flush_context):
+    note_write(db_session)
+
+
+@event.listens_for(Session, 'after_commit')
+def stick_to_primary(db_session):
+    if not db_session.info.pop('replicas_written', False) or not has_app_context():
+        return
+    # The rest of the request reads its own writes
+    g.pop('replica', None)
+    if has_request_context() and current_app.config.get('SQLALCHEMY_REPLICA_URIS'):
+        session['primary_until'] = time.time() + current_app.config.get('REPLICA_STICKY_SECONDS', 10)
+
+
+@event.listens_for(Session, 'after_soft_rollback')
+def forget_writes(db_session, previous_transaction):
+    db_session.info.pop('replicas_written', None)
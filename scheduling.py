@@ -0,0 +1,146 @@
+from datetime import datetime
+from itertools import islice
+
+from dateutil import rrule
+
+import counters
+import pagecache
+import replicas
+from models import Artist, Show, Venue, db
+
+#----------------------------------------------------------------------------#
+# Bulk show scheduling.
+#----------------------------------------------------------------------------#
+
+# Lists many shows of one artist at one venue in a single request, from a
+# recurrence rule (an RFC 5545 RRULE such as "FREQ=WEEKLY;COUNT=52",
+# repeating the first start time) or from a list of start times.
+#
+# Everything is checked before anything is written: the start times are
+# parsed and counted, the artist and the venue must exist, and each show is
+# compared with the others of the request and with the shows the venue or
+# the artist already has at the same time. The shows then go in with one
+# multi-row INSERT, and the counters with one UPDATE per owner, in a single
+# transaction. The venue and artist rows stay locked until it commits, so
+# requests for the same venue or artist are checked one after the other.
+
+# Default for BULK_SHOWS_MAX
+MAX_SHOWS = 5000
+
+
+class ScheduleError(ValueError):
+    """The request is rejected as a whole; nothing was written."""
+
+
+def start_times(rule=None, first=None, listed=None, limit=MAX_SHOWS):
+    """The start times of a request, from a recurrence rule or one per line of `listed`.
+
+    Raises ScheduleError for malformed input or more than `limit` shows.
+    """
+    if rule and listed:
+        raise ScheduleError('give a recurrence rule or a list of start times, not both')
+
+    if rule:
+        if first is None:
+            raise ScheduleError('a recurrence rule needs the start time of the first show')
+        try:
+            recurrence = rrule.rrulestr(rule, dtstart=first)
+        except (ValueError, TypeError) as error:
+            raise ScheduleError(f'invalid recurrence rule: {error}')
+        # A rule without COUNT or UNTIL never ends, it stops at the limit
+        result = list(islice(recurrence, limit + 1))
+    elif listed:
+        result = []
+        for number, line in enumerate(listed.splitlines(), 1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                result.append(datetime.fromisoformat(line))
+            except ValueError:
+                raise ScheduleError(f'line {number}: {line!r} is not a date and time (YYYY-MM-DD HH:MM)')
+            if len(result) > limit:
+                break
+    else:
+        raise ScheduleError('give a recurrence rule or a list of start times')
+
+    if not result:
+        raise ScheduleError('the request lists no show')
+    if len(result) > limit:
+        raise ScheduleError(f'at most {limit} shows can be listed at once')
+    return result
+
+
+def _booked(artist_id, venue_id, start_times):
+    # The shows of the venue or the artist between the first and the last
+    # start time, read through the (venue_id, start_time) and (artist_id,
+    # start_time) indexes
+    rows = db.session.query(Show.id, Show.venue_id, Show.artist_id, Show.start_time)\
+        .filter(db.or_(Show.venue_id == venue_id, Show.artist_id == artist_id))\
+        .filter(Show.start_time.between(min(start_times), max(start_times)))
+    venue_shows, artist_shows = {}, {}
+    for row in rows:
+        if row.venue_id == venue_id:
+            venue_shows[row.start_time] = row
+        if row.artist_id == artist_id:
+            artist_shows[row.start_time] = row
+    return venue_shows, artist_shows
+
+
+def _conflict(start_time, seen, venue_shows, artist_shows, artist_id):
+    if start_time in seen:
+        return 'listed twice in this request'
+    show = venue_shows.get(start_time)
+    if show is not None:
+        if show.artist_id == artist_id:
+            return f'already listed (show {show.id})'
+        return f'the venue has another show at this time (show {show.id})'
+    show = artist_shows.get(start_time)
+    if show is not None:
+        return f'the artist plays venue {show.venue_id} at this time (show {show.id})'
+    return None
+
+
+def schedule_shows(artist_id, venue_id, start_times, skip_conflicts=False):
+    """List a show of `artist_id` at `venue_id` for each of `start_times`.
+
+    Returns ([{'start_time', 'conflict'}] in request order, shows created).
+    A conflict is None or the reason the show cannot be listed. With
+    conflicts nothing is written, unless `skip_conflicts` lists the others.
+    Raises ScheduleError if the artist or the venue does not exist.
+    """
+    # Locked in the order the counter updates lock them
+    if db.session.query(Venue.id).filter(Venue.id == venue_id).with_for_update().first() is None:
+        raise ScheduleError(f'there is no venue {venue_id}')
+    if db.session.query(Artist.id).filter(Artist.id == artist_id).with_for_update().first() is None:
+        raise ScheduleError(f'there is no artist {artist_id}')
+
+    venue_shows, artist_shows = _booked(artist_id, venue_id, start_times)
+    rows, seen = [], set()
+    for start_time in start_times:
+        rows.append({
+            'start_time': start_time,
+            'conflict': _conflict(start_time, seen, venue_shows, artist_shows, artist_id)
+        })
+        seen.add(start_time)
+
+    new = [row['start_time'] for row in rows if row['conflict'] is None]
+    if not new or (len(new) < len(rows) and not skip_conflicts):
+        db.session.rollback()
+        return rows, 0
+
+    updated_at = datetime.utcnow()
+    db.session.execute(Show.__table__.insert().values([{
+        'artist_id': artist_id,
+        'venue_id': venue_id,
+        'start_time': start_time,
+        'updated_at': updated_at
+    } for start_time in new]))
+
+    # The INSERT bypasses the ORM events that keep the counters, purge the
+    # page cache and route the browser's next reads to the primary
+    counters.count_inserted_shows(db.session.connection(), venue_id, artist_id, new)
+    pagecache.purge_on_commit(db.session, 'shows', 'venues', f'venue:{venue_id}', f'artist:{artist_id}')
+    replicas.note_write(db.session)
+    db.session.commit()
+    return rows, len(new)
@@ -0,0 +1,192 @@
+"""Generate a large synthetic Fyyur dataset for load testing.
+
+    python scripts/generate_data.py --venues 100k --artists 500k --shows 20M --seed 42
+
+Rows are appended after the highest existing ids; nothing is dropped and
+missing tables are created. Popularity is skewed: a few venues host most of
+the shows (Zipf) and artists follow a flatter long tail. Shows are spread
+over the past and the future. Rows are generated and inserted in chunks
+(COPY on PostgreSQL, executemany elsewhere), so memory does not grow with
+the dataset. The id sequences and show counters are fixed up at the end.
+"""
+import argparse
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+from itertools import accumulate
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import counters
+import importer
+from app import app
+from models import Artist, ArtistGenre, Genre, Show, Venue, VenueGenre, db
+
+GENRES = [
+    'Alternative', 'Blues', 'Classical', 'Country', 'Electronic', 'Folk',
+    'Funk', 'Hip-Hop', 'Heavy Metal', 'Instrumental', 'Jazz',
+    'Musical Theatre', 'Pop', 'Punk', 'R&B', 'Reggae', 'Rock n Roll', 'Soul',
+    'Other'
+]
+
+# (city, state) pairs; earlier entries are picked more often
+CITIES = [
+    ('New York', 'NY'), ('Los Angeles', 'CA'), ('Chicago', 'IL'),
+    ('San Francisco', 'CA'), ('Austin', 'TX'), ('Nashville', 'TN'),
+    ('Seattle', 'WA'), ('Atlanta', 'GA'), ('New Orleans', 'LA'),
+    ('Boston', 'MA'), ('Denver', 'CO'), ('Portland', 'OR'),
+    ('Philadelphia', 'PA'), ('Miami', 'FL'), ('Detroit', 'MI'),
+    ('Minneapolis', 'MN'), ('Phoenix', 'AZ'), ('San Diego', 'CA'),
+    ('Dallas', 'TX'), ('Houston', 'TX'), ('Baltimore', 'MD'),
+    ('Kansas City', 'MO'), ('Memphis', 'TN'), ('Salt Lake City', 'UT'),
+]
+
+WORDS = [
+    'Blue', 'Velvet', 'Electric', 'Golden', 'Midnight', 'Silver', 'Wild',
+    'Crimson', 'Neon', 'Rusty', 'Lucky', 'Hidden', 'Broken', 'Royal',
+    'Sonic', 'Little', 'Lazy', 'Iron', 'Paper', 'Glass'
+]
+VENUE_KINDS = ['Hall', 'Lounge', 'Bar', 'Club', 'Theatre', 'Room', 'Garden', 'Cafe']
+ARTIST_KINDS = ['Band', 'Trio', 'Collective', 'Orchestra', 'Project', 'Quartet', 'Crew']
+
+SUFFIXES = {'k': 1000, 'm': 1000000}
+
+
+def count(value):
+    # Accepts plain integers and 100k / 20M style sizes
+    value = value.strip().lower()
+    if value[-1:] in SUFFIXES:
+        return int(float(value[:-1]) * SUFFIXES[value[-1]])
+    return int(value)
+
+
+def zipf_cum_weights(size, exponent):
+    # Cumulative weights of rank 1..size for random.choices
+    return list(accumulate(1.0 / rank ** exponent for rank in range(1, size + 1)))
+
+
+def chunks(total, chunk_size):
+    for start in range(0, total, chunk_size):
+        yield start, min(chunk_size, total - start)
+
+
+class Generator:
+
+    def __init__(self, args):
+        self.args = args
+        self.random = random.Random(args.seed)
+        self.connection = db.session.connection()
+        self.city_weights = zipf_cum_weights(len(CITIES), 1.0)
+
+    def next_id(self, model):
+        return (db.session.query(db.func.max(model.id)).scalar() or 0) + 1
+
+    def load(self, table, columns, rows):
+        return importer.load_rows(self.connection, table, columns, rows)
+
+    def report(self, name, rows, start):
+        seconds = time.perf_counter() - start
+        print(f'{name:<12} {rows:>12} rows {seconds:>8.2f}s {rows / max(seconds, 1e-9):>12.0f} rows/s')
+
+    def genre_ids(self):
+        # Reuse the genres already present, add the missing ones
+        existing = dict(db.session.query(Genre.name, Genre.id))
+        missing = [name for name in GENRES if name not in existing]
+        first_id = self.next_id(Genre)
+        self.load(Genre.__table__, ('id', 'name'),
+                  [(first_id + i, name) for i, name in enumerate(missing)])
+        existing.update((name, first_id + i) for i, name in enumerate(missing))
+        return list(existing.values())
+
+    def owners(self, model, association, owner_column, total, kinds, extra):
+        first_id = self.next_id(model)
+        start = time.perf_counter()
+        columns = ('id', 'name', 'city', 'state', 'phone', 'seeking_description') + tuple(extra)
+
+        for offset, size in chunks(total, self.args.chunk_size):
+            rows, genres = [], []
+            for owner_id in range(first_id + offset, first_id + offset + size):
+                city, state = self.random.choices(CITIES, cum_weights=self.city_weights)[0]
+                name = f'{self.random.choice(WORDS)} {self.random.choice(WORDS)} {self.random.choice(kinds)} {owner_id}'
+                phone = f'{self.random.randint(200, 999)}-{self.random.randint(100, 999)}-{self.random.randint(1000, 9999)}'
+                rows.append((owner_id, name, city, state, phone, None) + tuple(extra.values()))
+                for genre_id in self.random.sample(self.genres, self.random.randint(1, 3)):
+                    genres.append((genre_id, owner_id))
+
+            self.load(model.__table__, columns, rows)
+            self.load(association, ('genre_id', owner_column), genres)
+
+        self.report(model.__tablename__, total, start)
+        return first_id
+
+    def shows(self, first_venue_id, first_artist_id):
+        # Hot venues and a long tail of artists
+        venue_weights = zipf_cum_weights(self.args.venues, 1.1)
+        artist_weights = zipf_cum_weights(self.args.artists, 0.8)
+        venue_ids = range(first_venue_id, first_venue_id + self.args.venues)
+        artist_ids = range(first_artist_id, first_artist_id + self.args.artists)
+
+        now = datetime.now().replace(minute=0, second=0, microsecond=0)
+        past_hours = int(self.args.past_years * 365 * 24)
+        future_hours = int(self.args.future_years * 365 * 24)
+
+        first_id = self.next_id(Show)
+        start = time.perf_counter()
+        for offset, size in chunks(self.args.shows, self.args.chunk_size):
+            venues = self.random.choices(venue_ids, cum_weights=venue_weights, k=size)
+            artists = self.random.choices(artist_ids, cum_weights=artist_weights, k=size)
+            rows = []
+            for i in range(size):
+                if self.random.random() < self.args.upcoming_ratio:
+                    hours = self.random.randint(1, future_hours)
+                else:
+                    hours = -self.random.randint(0, past_hours)
+                rows.append((first_id + offset + i, now + timedelta(hours=hours), artists[i], venues[i]))
+            self.load(Show.__table__, ('id', 'start_time', 'artist_id', 'venue_id'), rows)
+
+        self.report('Show', self.args.shows, start)
+
+    def run(self):
+        self.genres = self.genre_ids()
+        first_venue_id = self.owners(Venue, VenueGenre, 'venue_id', self.args.venues, VENUE_KINDS,
+                                     {'seeking_talent': False})
+        first_artist_id = self.owners(Artist, ArtistGenre, 'artist_id', self.args.artists, ARTIST_KINDS,
+                                      {'seeking_venue': False})
+        if self.args.venues and self.args.artists:
+            self.shows(first_venue_id, first_artist_id)
+
+        importer.sync_id_sequences(self.connection)
+        db.session.commit()
+
+        # The rows bypassed the ORM events that maintain the show counters
+        start = time.perf_counter()
+        counters.rebuild()
+        self.report('counters', self.args.shows, start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--venues', type=count, default=count('1k'))
+    parser.add_argument('--artists', type=count, default=count('5k'))
+    parser.add_argument('--shows', type=count, default=count('100k'))
+    parser.add_argument('--seed', type=int, default=0, help='random seed, same seed gives the same data')
+    parser.add_argument('--upcoming-ratio', type=float, default=0.2, help='share of shows in the future')
+    parser.add_argument('--past-years', type=float, default=10)
+    parser.add_argument('--future-years', type=float, default=2)
+    parser.add_argument('--chunk-size', type=count, default=count('50k'), help='rows generated per insert')
+    parser.add_argument('--database-url', help='defaults to SQLALCHEMY_DATABASE_URI from config.py')
+    args = parser.parse_args()
+
+    if args.database_url:
+        app.config['SQLALCHEMY_DATABASE_URI'] = args.database_url
+
+    with app.app_context():
+        # Only creates the tables that do not exist yet
+        db.create_all()
+        Generator(args).run()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,94 @@
+import re
+
+from models import db
+
+#----------------------------------------------------------------------------#
+# Search.
+#----------------------------------------------------------------------------#
+
+# Venues and artists are matched on name, city and state.
+#
+# On PostgreSQL the match is served by the indexes created in the
+# b3c1d2e4f5a6 migration:
+#   * a GIN index on the `simple` tsvector of name, city and state answers
+#     prefix queries ("musi hop" matches "The Musical Hop"),
+#   * GIN trigram indexes on name answer substring matches (ILIKE) and
+#     typos through the pg_trgm similarity operator ("Musicl Hop").
+# Results are ranked by ts_rank plus trigram similarity.
+#
+# Other backends (SQLite in development) fall back to ILIKE on every word of
+# the term and rank exact and prefix name matches first. They have no typo
+# tolerance.
+
+# Must stay identical to the expression indexed by the migration, otherwise
+# PostgreSQL cannot use the index.
+SEARCH_DOCUMENT = ("to_tsvector('simple', coalesce(\"{table}\".name, '') || ' ' || "
+                   "coalesce(\"{table}\".city, '') || ' ' || coalesce(\"{table}\".state, ''))")
+
+WORD_RE = re.compile(r'\w+', re.UNICODE)
+
+
+def search_terms(search_term):
+    """Split a search term into lower-cased words."""
+    return [word.lower() for word in WORD_RE.findall(search_term)]
+
+
+def escape_like(value):
+    """Escape `value` to match itself in a LIKE pattern with ESCAPE '\\'."""
+    return value.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+
+def match(model, search_term):
+    """Return (criterion, rank) matching `model` rows against `search_term`.
+
+    `rank` is a column expression; higher means more relevant.
+    """
+    words = search_terms(search_term)
+    if not words:
+        # An empty search lists everything, as it always did. PostgreSQL
+        # reads a bare constant in ORDER BY as a column position.
+        return db.true(), db.cast(0, db.Integer)
+
+    if db.session.get_bind().dialect.name == 'postgresql':
+        return _match_postgresql(model, search_term.strip(), words)
+    return _match_fallback(model, search_term.strip(), words)
+
+
+def _match_postgresql(model, search_term, words):
+    document = db.literal_column(SEARCH_DOCUMENT.format(table=model.__tablename__))
+
+    # Every word must match the start of a word in name, city or state
+    query = db.func.to_tsquery(db.literal_column("'simple'"),
+                               ' & '.join(f'{word}:*' for word in words))
+
+    # pg_trgm's similarity operator is written `%`. In text() the compiler
+    # doubles it for the driver's paramstyle when it has to.
+    similar = db.text(f'"{model.__tablename__}".name % :similar_term')\
+        .bindparams(similar_term=search_term)
+
+    criterion = db.or_(
+        document.op('@@')(query),
+        model.name.ilike(f'%{escape_like(search_term)}%', escape='\\'),
+        similar
+    )
+    rank = db.func.ts_rank(document, query) + db.func.similarity(model.name, search_term)
+    return criterion, rank
+
+
+def _match_fallback(model, search_term, words):
+    # Each word has to appear somewhere in name, city or state. Words may
+    # hold an underscore, which LIKE would read as a wildcard.
+    criterion = db.and_(*[db.or_(
+        model.name.ilike(f'%{escape_like(word)}%', escape='\\'),
+        model.city.ilike(f'%{escape_like(word)}%', escape='\\'),
+        model.state.ilike(f'%{escape_like(word)}%', escape='\\')
+    ) for word in words])
+
+    name = db.func.lower(model.name)
+    term = escape_like(search_term.lower())
+    rank = db.case([
+        (name == search_term.lower(), 3),
+        (name.like(f'{term}%', escape='\\'), 2),
+        (name.like(f'%{term}%', escape='\\'), 1)
+    ], else_=0)
+    return criterion, rank
@@ -2,3 +2,16 @@ window.parseISOString = function parseISOString(s) {
   var b = s.split(/\D+/);
   return new Date(Date.UTC(b[0], --b[1], b[2], b[3], b[4], b[5], b[6]));
 };
+
+// Replace a "Show more" button with the next page of show tiles.
+document.addEventListener('click', function (event) {
+  var link = event.target.closest('.load-more a');
+  if (!link) {
+    return;
+  }
+  event.preventDefault();
+  var container = link.parentNode;
+  fetch(link.href)
+    .then(function (response) { return response.text(); })
+    .then(function (html) { container.outerHTML = html; });
+});
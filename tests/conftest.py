@@ -0,0 +1,71 @@
+import os
+import shutil
+import sys
+from argparse import Namespace
+
+import pytest
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, '..'))
+sys.path.insert(0, os.path.join(HERE, '..', 'scripts'))
+
+import generate_data
+from app import app as flask_app
+from models import db
+
+
+@pytest.fixture(scope='session')
+def app(tmp_path_factory):
+    """The app on a SQLite file seeded with scripts/generate_data.py."""
+    directory = tmp_path_factory.mktemp('fyyur')
+    flask_app.config.update(
+        SQLALCHEMY_DATABASE_URI=f'sqlite:///{directory / "fyyur.db"}',
+        SQLALCHEMY_TRACK_MODIFICATIONS=False,
+        ARCHIVE_DIR=str(directory / 'archive'),
+        # Count the statements of the rendering, not of the page cache
+        PAGE_CACHE=False,
+        TESTING=True,
+    )
+    with flask_app.app_context():
+        db.drop_all()
+        db.create_all()
+        generate_data.Generator(Namespace(
+            seed=0, upcoming_ratio=0.2, past_years=10, future_years=2, chunk_size=50000,
+            venues=20, artists=100, shows=2000
+        )).run()
+        db.session.remove()
+        yield flask_app
+
+
+@pytest.fixture
+def isolated_app(app, tmp_path):
+    """The app on a copy of the seeded database and an ARCHIVE_DIR of its own.
+
+    For the tests that write: the database the other tests share is left
+    as it was.
+    """
+    shared = {name: app.config[name] for name in ('SQLALCHEMY_DATABASE_URI', 'ARCHIVE_DIR')}
+    db.session.remove()
+    shutil.copy(shared['SQLALCHEMY_DATABASE_URI'][len('sqlite:///'):], tmp_path / 'fyyur.db')
+    # Flask-SQLAlchemy opens a new engine when the URI changes
+    app.config.update(
+        SQLALCHEMY_DATABASE_URI=f'sqlite:///{tmp_path / "fyyur.db"}',
+        ARCHIVE_DIR=str(tmp_path / 'archive'),
+    )
+    yield app
+    db.session.remove()
+    app.config.update(shared)
+
+
+@pytest.fixture
+def statements(app):
+    """A list of the SQL statements run since the test started, on any engine."""
+    result = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        result.append(statement)
+    event.listen(Engine, 'before_cursor_execute', record)
+    yield result
+    event.remove(Engine, 'before_cursor_execute', record)
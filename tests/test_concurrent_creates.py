@@ -0,0 +1,13 @@
+import os
+import sys
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, '..', 'benchmarks'))
+
+import bench_concurrent_creates
+
+
+def test_concurrent_creates_have_no_conflict(isolated_app):
+    created, errors, elapsed = bench_concurrent_creates.create_shows(threads=8, requests=40)
+    assert not errors
+    assert created == 40
@@ -0,0 +1,26 @@
+from flask import g
+
+import instrumentation
+from models import Venue, db
+from queries import concurrently
+
+
+def test_concurrently_merges_worker_timings(app, monkeypatch, statements):
+    monkeypatch.setitem(app.config, 'CONCURRENT_QUERIES', True)
+    with app.test_request_context('/'):
+        instrumentation._listen(db.engine)
+        g.request_timings = instrumentation.RequestTimings()
+
+        venue, count, total = concurrently(
+            lambda: Venue.query.get(1),
+            lambda: db.session.query(db.func.count(Venue.id)).scalar(),
+            lambda: db.session.execute('SELECT 1 + 1').scalar())
+        assert (venue.id, total) == (1, 2)
+        assert count >= 1
+        assert g.request_timings.count == len(statements) == 3
+
+        # The caller's connection went back to the pool without expiring what it loaded
+        statements.clear()
+        assert venue.name
+        assert not statements
+        db.session.remove()
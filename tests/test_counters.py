@@ -0,0 +1,18 @@
+from datetime import datetime, timedelta
+
+import counters
+from models import Show
+from queries import venue_areas, venue_detail
+
+
+def test_counts_agree_with_the_lists_between_rollovers(isolated_app):
+    # As if the last rollover ran three weeks ago
+    counters.rebuild(datetime.now() - timedelta(days=21))
+
+    now = datetime.now()
+    areas = {venue['id']: venue for area in venue_areas() for venue in area['venues']}
+    for venue_id in range(1, 11):
+        upcoming = Show.query.filter(Show.venue_id == venue_id, Show.start_time > now).count()
+        past = Show.query.filter(Show.venue_id == venue_id, Show.start_time <= now).count()
+        assert venue_detail(venue_id)[1:] == (upcoming, past)
+        assert areas[venue_id]['num_upcoming_shows'] == upcoming
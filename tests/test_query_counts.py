@@ -0,0 +1,56 @@
+import json
+import os
+import sys
+from datetime import datetime, timedelta
+
+import pytest
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, '..', 'benchmarks'))
+
+import archive
+import routes
+
+# The venue and artist pages read their header, their show sections and the
+# version answering conditional GETs in at most this many statements
+DETAIL_STATEMENTS = 3
+
+DETAIL_PAGES = [f'/{kind}/{owner_id}' for kind in ('venues', 'artists') for owner_id in (1, 2, 7, 20, 99999)]
+
+
+def get(app, url, **kwargs):
+    with app.test_client() as client:
+        response = client.get(url, **kwargs)
+        response.get_data()
+        return response
+
+
+@pytest.mark.parametrize('name, url', [(name, url) for name, method, url, data in routes.ROUTES if method == 'GET'])
+def test_route_within_baseline(app, statements, name, url):
+    with open(routes.BASELINE) as baseline_file:
+        expected = json.load(baseline_file)['small'][name]['queries']
+    get(app, url)
+    statements.clear()
+    assert get(app, url).status_code == 200
+    assert len(statements) <= expected, statements
+
+
+@pytest.mark.parametrize('url', DETAIL_PAGES)
+def test_detail_page_statements(app, statements, url):
+    response = get(app, url)
+    assert response.status_code in (200, 404)
+    assert len(statements) <= DETAIL_STATEMENTS, statements
+
+    if response.status_code == 200:
+        statements.clear()
+        assert get(app, url, headers={'If-None-Match': response.headers['ETag']}).status_code == 304
+        assert len(statements) <= 1, statements
+
+
+@pytest.mark.parametrize('url', DETAIL_PAGES)
+def test_archived_detail_page_statements(isolated_app, statements, url):
+    archive.archive_shows(datetime.now() - timedelta(days=365))
+    statements.clear()
+    response = get(isolated_app, url)
+    assert response.status_code in (200, 404)
+    assert len(statements) <= DETAIL_STATEMENTS, statements
@@ -0,0 +1,16 @@
+from models import Venue, db
+from queries import venue_search
+
+
+def test_like_wildcards_match_themselves(isolated_app):
+    db.session.add_all([
+        Venue(name='Under_score Club', city='Wildcard', state='CA'),
+        Venue(name='Under-score Hall', city='Wildcard', state='CA'),
+        Venue(name='Back\\slash Bar', city='Wildcard', state='CA'),
+    ])
+    db.session.commit()
+
+    assert [row.name for row in venue_search('under_score')['data']] == ['Under_score Club']
+    assert [row.name for row in venue_search('back\\slash')['data']] == ['Back\\slash Bar']
+    # No word to match lists everything
+    assert venue_search('%')['count'] == Venue.query.count()
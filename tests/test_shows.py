@@ -0,0 +1,32 @@
+import re
+from datetime import datetime
+
+import pytest
+
+from models import Show
+
+
+def pager_links(app, url):
+    html = app.test_client().get(url).get_data(as_text=True)
+    return [link.replace('&amp;', '&') for link in re.findall(r'href="(/shows\?[^"]+)"', html)]
+
+
+def test_pager_keeps_the_page_size(app):
+    later = pager_links(app, '/shows?limit=20')[-1]
+    assert later.endswith('&limit=20')
+    assert all(link.endswith('&limit=20') for link in pager_links(app, later))
+
+
+def test_pager_leaves_out_the_default_page_size(app):
+    assert not any('limit=' in link for link in pager_links(app, '/shows'))
+
+
+@pytest.mark.parametrize('start_time', ['2040-01-01 10:00', '2040-01-01 10:00:00'])
+def test_bulk_shows_first_show_with_or_without_seconds(isolated_app, start_time):
+    html = isolated_app.test_client().post('/shows/create/bulk', data={
+        'artist_id': 1, 'venue_id': 1, 'start_time': start_time, 'rule': 'FREQ=WEEKLY;COUNT=3',
+    }).get_data(as_text=True)
+    assert '3 shows were successfully listed!' in html
+    with isolated_app.app_context():
+        listed = Show.query.filter(Show.artist_id == 1, Show.start_time >= datetime(2040, 1, 1))
+        assert [show.start_time.day for show in listed.order_by(Show.start_time)] == [1, 8, 15]
@@ -0,0 +1,16 @@
+import pytest
+
+STATS = ['/cache/stats', '/pool/stats', '/replicas/stats']
+
+
+@pytest.mark.parametrize('url', STATS)
+def test_stats_hidden_by_default(app, url):
+    assert app.test_client().get(url).status_code == 404
+
+
+@pytest.mark.parametrize('url', STATS)
+def test_stats_served_with_flag(app, monkeypatch, url):
+    monkeypatch.setitem(app.config, 'STATS_ENDPOINTS', True)
+    response = app.test_client().get(url)
+    assert response.status_code == 200
+    assert response.is_json